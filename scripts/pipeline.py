@@ -49,7 +49,6 @@ async def main():
     # Imports
     sys.path.insert(0, str(BASE_PATH))
     from datasets import load_dataset
-    from openai import AsyncOpenAI
     from tqdm import tqdm
     from src import (
         get_doc_id,
@@ -57,14 +56,17 @@ async def main():
         process_pdfs_with_mineru,
         extract_tables_from_output,
         merge_consecutive_tables,
+        group_tables_by_doc,
         find_summary_compensation_in_doc,
         extract_all_summary_compensation,
+        build_vlm_client,
         save_classification_results,
         save_extraction_results,
         save_no_sct_results,
         fix_all_orphan_images,
         Tracker,
     )
+    from src.vlm.classification import CLASSIFY_MAX_CONCURRENT
     
     # Initialize tracker
     tracker = Tracker(BASE_PATH)
@@ -150,8 +152,8 @@ async def main():
     # Get docs to process
     docs_to_process = [doc_id_to_doc[d] for d in doc_ids_to_process if d in doc_id_to_doc]
     
-    # Initialize VLM client
-    client = AsyncOpenAI(base_url=VLM_BASE_URL, api_key="dummy")
+    # Initialize VLM client (one pooled client for the whole run)
+    client = build_vlm_client(VLM_BASE_URL, max_connections=DOC_MAX_CONCURRENT * CLASSIFY_MAX_CONCURRENT)
     
     # =========================================================================
     # PHASE 1: Convert HTML to PDF
@@ -238,6 +240,7 @@ async def main():
         save_path=str(BASE_PATH / "all_tables.json")
     )
     print(f"✓ Extracted {len(all_tables)} tables from {len(extraction_stats['with_tables'])} documents")
+    tables_by_doc = group_tables_by_doc(all_tables)
     
     # =========================================================================
     # PHASE 5: Classification + Extraction
@@ -259,8 +262,7 @@ async def main():
         need_classify.append(doc_id)
     
     # Also include docs with tables from extraction_stats
-    doc_sources_with_tables = set(t.get('source_doc') for t in all_tables)
-    need_classify = [d for d in need_classify if d in doc_sources_with_tables]
+    need_classify = [d for d in need_classify if d in tables_by_doc]
     
     print(f"Documents to classify: {len(need_classify)}")
     
@@ -279,15 +281,24 @@ async def main():
         async with doc_semaphore:
             try:
                 # Classify tables
-                found, all_classifications = await find_summary_compensation_in_doc(
+                found, all_classifications, failed = await find_summary_compensation_in_doc(
                     doc_source=doc_id,
                     all_tables=all_tables,
                     client=client,
                     model=VLM_MODEL,
                     base_path=BASE_PATH,
-                    debug=False
+                    debug=False,
+                    tables_by_doc=tables_by_doc
                 )
                 
+                # Tables lost to VLM errors: don't record a (possibly wrong) result,
+                # leave the document pending so the next run retries it
+                if failed:
+                    async with stats_lock:
+                        stats["errors"] += 1
+                    tqdm.write(f"✗ {doc_id}: {len(failed)} tables failed classification, will retry")
+                    return
+                
                 if not found:
                     save_no_sct_results(OUTPUT_PATH / doc_id, metadata=meta)
                     tracker.set_phase(doc_id, "extracted")
@@ -298,7 +309,8 @@ async def main():
                 
                 # Merge consecutive tables
                 images_base_dir = OUTPUT_PATH / doc_id / doc_id / "vlm"
-                found = merge_consecutive_tables(found, images_base_dir, all_tables, all_classifications, debug=False)
+                found = merge_consecutive_tables(found, images_base_dir, all_tables, all_classifications, debug=False,
+                                                 tables_by_doc=tables_by_doc)
                 
                 # Extract compensation data
                 extracted = await extract_all_summary_compensation(
@@ -310,6 +322,13 @@ async def main():
                     metadata=meta
                 )
                 
+                n_failed = sum(e is None for e in extracted)
+                if n_failed:
+                    async with stats_lock:
+                        stats["errors"] += 1
+                    tqdm.write(f"✗ {doc_id}: {n_failed} tables failed extraction, will retry")
+                    return
+                
                 # Save results
                 save_classification_results(found, OUTPUT_PATH / doc_id, metadata=meta)
                 save_extraction_results(extracted, OUTPUT_PATH / doc_id, metadata=meta)
@@ -329,6 +348,7 @@ async def main():
                 tracker.set_phase(doc_id, "extracted")
                 tracker.set_status(doc_id, "complete")
                 tracker.set_sct_tables(doc_id, sct_paths)
+                tracker.maybe_save()  # Periodic checkpoint during long runs
                 
                 async with stats_lock:
                     stats["processed"] += 1
@@ -354,7 +374,7 @@ async def main():
             continue  # Fund
         if tracker.has_phase(doc_id, "extracted"):
             continue  # Already done
-        if tracker.has_phase(doc_id, "mineru_done") and doc_id not in doc_sources_with_tables:
+        if tracker.has_phase(doc_id, "mineru_done") and doc_id not in tables_by_doc:
             # Has MinerU but no tables extracted
             meta_path = OUTPUT_PATH / doc_id / "metadata.json"
             if meta_path.exists():
@@ -13,11 +13,15 @@ Usage:
     python scripts/post_processing.py --push-only # Push existing dataset (no rebuild)
 """
 
-import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from collections import Counter
 
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datasets import Dataset, Image as HFImage
 from huggingface_hub import HfApi
 from tqdm.auto import tqdm
@@ -30,6 +34,7 @@ BASE_PATH = Path(__file__).parent.parent.resolve()
 OUTPUT_PATH = BASE_PATH / "output"
 DOCS_PATH = BASE_PATH / "docs"
 HF_LOCAL_PATH = BASE_PATH / "hf/execcomp-ai-postprocessed"
+HF_PARQUET_PATH = BASE_PATH / "hf/execcomp-ai-postprocessed.parquet"  # Staging file for the build
 HF_REPO = "pierjoe/execcomp-ai-sample"
 
 # Classifier settings
@@ -38,8 +43,20 @@ HF_REPO = "pierjoe/execcomp-ai-sample"
 # CLASSIFIER_MODEL_PATH = None  # or "pierjoe/Qwen3-VL-4B-SCT-Classifier" or local path
 CLASSIFIER_MODEL_PATH = "hf/models/exp3-weighted-loss-qwen3-bigger_dataset/full"
 CLASSIFIER_BATCH_SIZE = 8
+CLASSIFIER_PREPROCESS_WORKERS = 4  # One large classify_batch call: worker startup is paid once
 CLASSIFIER_DEVICE = "cuda:0"
 
+# Record collection (one task per output folder)
+SCAN_WORKERS = None  # None = os.cpu_count()
+SCAN_CHUNKSIZE = 32  # Folders per task sent to a worker (amortizes IPC)
+
+# Parquet staging
+PARQUET_BATCH_SIZE = 1024  # Records per RecordBatch flushed to the writer
+
+# Hub upload: shards are embedded/serialized and uploaded by PUSH_NUM_PROC processes
+PUSH_MAX_SHARD_SIZE = "500MB"
+PUSH_NUM_PROC = min(8, os.cpu_count() or 1)
+
 # Filtering (set to None to keep all records)
 SCT_PROBABILITY_THRESHOLD = None  # e.g., 0.5 to filter low-confidence
 
@@ -50,6 +67,32 @@ RUN_THRESHOLD_ANALYSIS = True
 # Add src to path
 sys.path.insert(0, str(BASE_PATH))
 
+# Per-document metadata, repeated on every table of the document (and across
+# documents for sic/state/company): interned in memory
+REPEATED_FIELDS = ("cik", "company", "filing_date", "sic", "state_of_inc",
+                   "filing_html_index", "accession_number")
+
+# Explicit column types: no inference pass over the records
+RECORD_SCHEMA = pa.schema([
+    pa.field("cik", pa.string()),
+    pa.field("company", pa.string()),
+    pa.field("year", pa.int64()),
+    pa.field("filing_date", pa.string()),
+    pa.field("sic", pa.string()),
+    pa.field("state_of_inc", pa.string()),
+    pa.field("filing_html_index", pa.string()),
+    pa.field("accession_number", pa.string()),
+    pa.field("table_image", pa.string()),
+    pa.field("table_body", pa.string()),
+    pa.field("executives", pa.string()),
+    pa.field("sct_probability", pa.float64()),
+])
+
+
+def push_dataset(hf_dataset):
+    """Push the dataset to HF_REPO, preparing and uploading shards in parallel."""
+    hf_dataset.push_to_hub(HF_REPO, max_shard_size=PUSH_MAX_SHARD_SIZE, num_proc=PUSH_NUM_PROC)
+
 
 def push_only():
     """Push existing local dataset to HuggingFace without rebuilding."""
@@ -71,7 +114,7 @@ def push_only():
     
     # Push to Hub
     print(f"\nPushing dataset to {HF_REPO}...")
-    hf_dataset.push_to_hub(HF_REPO)
+    push_dataset(hf_dataset)
     print(f"✓ Dataset pushed")
     
     # Upload docs
@@ -100,6 +143,77 @@ def push_only():
     print("=" * 60)
 
 
+def _collect_doc_records(doc_dir: Path) -> list[dict]:
+    """Build the records of one output folder (sct_probability still None)."""
+    # One readdir instead of a stat per expected file
+    with os.scandir(doc_dir) as entries:
+        names = {e.name for e in entries}
+    
+    if "metadata.json" not in names:
+        return []
+    meta = orjson.loads((doc_dir / "metadata.json").read_bytes())
+    
+    # Skip funds
+    if meta.get("sic") == "NULL" or meta.get("sic") is None:
+        return []
+    
+    if "extraction_results.json" not in names or "classification_results.json" not in names:
+        return []
+    
+    extraction = orjson.loads((doc_dir / "extraction_results.json").read_bytes())
+    classification = orjson.loads((doc_dir / "classification_results.json").read_bytes())
+    
+    # Files img_path can point to, relative to vlm/: MinerU crops ("images/<name>")
+    # and merged tables written next to them ("merged_<index>.jpg")
+    images_dir = doc_dir / doc_dir.name / "vlm"
+    image_paths = set()
+    for prefix in ("", "images/"):
+        try:
+            with os.scandir(images_dir / prefix) as entries:
+                image_paths.update(prefix + e.name for e in entries if e.is_file())
+        except FileNotFoundError:
+            pass
+    
+    # Base record
+    base_record = {
+        "cik": meta.get("cik"),
+        "company": meta.get("company"),
+        "year": meta.get("year"),
+        "filing_date": meta.get("filing_date"),
+        "sic": meta.get("sic"),
+        "state_of_inc": meta.get("state_of_inc"),
+        "filing_html_index": meta.get("filing_html_index"),
+        "accession_number": meta.get("accession_number"),
+    }
+    
+    extracted = extraction.get("data", [])
+    
+    records = []
+    # For each table: one dict display per record (no copy + per-key updates)
+    for i, table_info in enumerate(classification.get("tables", [])):
+        table = table_info.get("table", {})
+        
+        # Image path
+        img_path = table.get("img_path", "")
+        table_image = str(images_dir / img_path) if img_path in image_paths else None
+        
+        # Executives
+        if i < len(extracted) and extracted[i] is not None:
+            executives = orjson.dumps(extracted[i].get("executives", [])).decode()
+        else:
+            executives = "[]"
+        
+        records.append({
+            **base_record,
+            "table_image": table_image,
+            "table_body": table.get("table_body", ""),
+            "executives": executives,
+            "sct_probability": None,  # Placeholder, filled in batch
+        })
+    
+    return records
+
+
 def build_records_with_probability(output_path: Path, classifier) -> list[dict]:
     """
     Build dataset records with SCT probability scores.
@@ -116,74 +230,23 @@ def build_records_with_probability(output_path: Path, classifier) -> list[dict]:
     record_indices = []  # Track which record each image belongs to
 
     # First pass: collect all records and image paths
+    # Folders are independent (3 JSON parses each): scan them across processes
     print("\n[1/2] Collecting records...")
-    for doc_dir in tqdm(list(output_path.iterdir()), desc="Scanning"):
-        if not doc_dir.is_dir():
-            continue
-        
-        extraction_file = doc_dir / "extraction_results.json"
-        classification_file = doc_dir / "classification_results.json"
-        metadata_file = doc_dir / "metadata.json"
-        
-        if not metadata_file.exists():
-            continue
-        with open(metadata_file) as f:
-            meta = json.load(f)
-        
-        # Skip funds
-        if meta.get("sic") == "NULL" or meta.get("sic") is None:
-            continue
-        
-        if not extraction_file.exists() or not classification_file.exists():
-            continue
-        
-        with open(extraction_file) as f:
-            extraction = json.load(f)
-        with open(classification_file) as f:
-            classification = json.load(f)
-        
-        # Base record
-        base_record = {
-            "cik": meta.get("cik"),
-            "company": meta.get("company"),
-            "year": meta.get("year"),
-            "filing_date": meta.get("filing_date"),
-            "sic": meta.get("sic"),
-            "state_of_inc": meta.get("state_of_inc"),
-            "filing_html_index": meta.get("filing_html_index"),
-            "accession_number": meta.get("accession_number"),
-        }
-        
-        # For each table
-        for i, table_info in enumerate(classification.get("tables", [])):
-            record = base_record.copy()
-            
-            # Image path
-            img_path = table_info.get("table", {}).get("img_path", "")
-            images_dir = doc_dir / doc_dir.name / "vlm"
-            full_img_path = images_dir / img_path
-            
-            if full_img_path.exists():
-                record["table_image"] = str(full_img_path)
-                image_paths.append(full_img_path)
-                record_indices.append(len(records))
-            else:
-                record["table_image"] = None
-            
-            # HTML body
-            record["table_body"] = table_info.get("table", {}).get("table_body", "")
-            
-            # Executives
-            if i < len(extraction.get("data", [])):
-                execs = extraction["data"][i].get("executives", [])
-                record["executives"] = json.dumps(execs)
-            else:
-                record["executives"] = json.dumps([])
-            
-            # Placeholder for probability (will fill in batch)
-            record["sct_probability"] = None
-            
-            records.append(record)
+    # DirEntry.is_dir() uses the readdir entry type, no stat per folder
+    with os.scandir(output_path) as entries:
+        doc_dirs = [Path(e.path) for e in entries if e.is_dir()]
+    with ProcessPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        doc_records = executor.map(_collect_doc_records, doc_dirs, chunksize=SCAN_CHUNKSIZE)
+        for recs in tqdm(doc_records, total=len(doc_dirs), desc="Scanning"):
+            for record in recs:
+                for key in REPEATED_FIELDS:
+                    value = record[key]
+                    if type(value) is str:
+                        record[key] = sys.intern(value)
+                if record["table_image"] is not None:
+                    image_paths.append(Path(record["table_image"]))
+                    record_indices.append(len(records))
+                records.append(record)
     
     print(f"✓ Found {len(records)} records, {len(image_paths)} with images")
     
@@ -193,8 +256,10 @@ def build_records_with_probability(output_path: Path, classifier) -> list[dict]:
         probabilities = classifier.classify_batch(
             image_paths, 
             batch_size=CLASSIFIER_BATCH_SIZE,
-            show_progress=True
+            show_progress=True,
+            num_workers=CLASSIFIER_PREPROCESS_WORKERS
         )
+        classifier.release_buffers()  # Last GPU use of the run
         
         # Assign probabilities to records
         for idx, prob in zip(record_indices, probabilities):
@@ -208,6 +273,23 @@ def build_records_with_probability(output_path: Path, classifier) -> list[dict]:
     return records
 
 
+def write_records_parquet(records: list[dict], path: Path) -> Path:
+    """
+    Stream records to a Parquet file in RecordBatches of PARQUET_BATCH_SIZE.
+    
+    Only one batch is converted to Arrow at a time, instead of a full
+    Arrow copy of the whole list (Dataset.from_list). ParquetWriter
+    dictionary-encodes every column by default (falling back to plain pages
+    for near-unique ones like table_body), so repeated metadata is stored once.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with pq.ParquetWriter(str(path), RECORD_SCHEMA) as writer:
+        for start in range(0, len(records), PARQUET_BATCH_SIZE):
+            batch = records[start:start + PARQUET_BATCH_SIZE]
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=RECORD_SCHEMA))
+    return path
+
+
 def print_stats(records: list[dict]):
     """Print dataset statistics."""
     print("\n" + "=" * 60)
@@ -349,7 +431,8 @@ def main():
     
     # Create HF dataset
     print("\nCreating HuggingFace dataset...")
-    hf_dataset = Dataset.from_list(records)
+    write_records_parquet(records, HF_PARQUET_PATH)
+    hf_dataset = Dataset.from_parquet(str(HF_PARQUET_PATH))
     hf_dataset = hf_dataset.cast_column("table_image", HFImage())
     print(f"✓ Dataset: {hf_dataset}")
     
@@ -362,7 +445,7 @@ def main():
     # Push to Hub (if --push)
     if push_mode:
         print(f"\nPushing dataset to {HF_REPO}...")
-        hf_dataset.push_to_hub(HF_REPO)
+        push_dataset(hf_dataset)
         print(f"✓ Dataset pushed")
         
         # Upload docs (README + images)
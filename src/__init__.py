@@ -4,12 +4,14 @@
 from .vlm import (
     TableType,
     TableClassification,
+    ClassificationRow,
     Executive,
     SummaryCompensationTable,
     find_summary_compensation_in_doc,
     extract_summary_compensation_table,
     extract_all_summary_compensation,
     SCTClassifier,
+    build_vlm_client,
 )
 
 # Processing - PDF conversion, MinerU, table extraction
@@ -19,6 +21,7 @@ from .processing import (
     process_pdfs_with_mineru,
     extract_tables_from_output,
     merge_consecutive_tables,
+    group_tables_by_doc,
     fix_orphan_images,
     fix_all_orphan_images,
 )
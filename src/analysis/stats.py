@@ -159,8 +159,9 @@ def collect_pipeline_data(output_path: Path, tracker) -> tuple[pd.DataFrame, pd.
                 "sic": meta.get("sic"),
             })
             
-            if i < len(extraction.get("data", [])):
-                for exec_data in extraction["data"][i].get("executives", []):
+            data = extraction.get("data", [])
+            if i < len(data) and data[i] is not None:
+                for exec_data in data[i].get("executives", []):
                     exec_data["cik"] = meta.get("cik")
                     exec_data["company"] = meta.get("company")
                     exec_data["filing_year"] = meta.get("year")  # Year of the SEC filing
@@ -1,6 +1,7 @@
 # IO module - Results saving and visualization
 
 from .results import save_classification_results, save_extraction_results, save_no_sct_results
+from .images import load_image_b64, load_image_b64_async, load_image_url_async
 from .visualization import (
     display_extraction_result,
     display_all_results,
@@ -0,0 +1,104 @@
+"""Content-addressed cache for VLM responses (memory LRU + disk)."""
+
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+# ============== CONFIGURATION ==============
+CACHE_ENABLED = True
+CACHE_DIR = Path(__file__).parent.parent.parent / ".cache/vlm"
+MEMORY_CACHE_SIZE = 1024  # Max entries kept in memory
+
+_memory_cache: "OrderedDict[str, str]" = OrderedDict()
+_disk_cache = None
+
+
+def make_cache_key(*parts) -> str:
+    """Build a sha256 key from strings/bytes (model, prompt version, prompt, image...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        elif not isinstance(part, (bytes, bytearray)):
+            part = str(part).encode("utf-8")
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def _get_disk_cache():
+    """Lazy open the disk cache."""
+    global _disk_cache
+    if _disk_cache is None:
+        import diskcache
+        _disk_cache = diskcache.Cache(str(CACHE_DIR))
+    return _disk_cache
+
+
+def _remember(key: str, value: str):
+    _memory_cache[key] = value
+    _memory_cache.move_to_end(key)
+    if len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def cache_get(key: str) -> Optional[str]:
+    """Look up a cached value (memory first, then disk)."""
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+    value = _get_disk_cache().get(key)
+    if value is not None:
+        _remember(key, value)
+    return value
+
+
+def cache_set(key: str, value: str):
+    """Store a value in both cache tiers."""
+    _remember(key, value)
+    _get_disk_cache().set(key, value)
+
+
+def _identity(value: str) -> str:
+    return value
+
+
+def cache_delete(key: str):
+    """Drop a value from both cache tiers."""
+    _memory_cache.pop(key, None)
+    _get_disk_cache().delete(key)
+
+
+async def get_or_compute_async(key: str, coro_factory: Callable[[], Awaitable[str]],
+                               parse: Optional[Callable[[str], Any]] = None) -> Any:
+    """
+    Return the cached value for key, or await coro_factory() and cache it.
+
+    Only successful results are cached; exceptions propagate untouched.
+    With parse (e.g. Model.model_validate_json), the parsed value is returned and
+    a cached entry that no longer parses (ValueError, e.g. pydantic ValidationError
+    after a schema change) is evicted and recomputed instead of failing forever.
+    """
+    if parse is None:
+        parse = _identity
+
+    if not CACHE_ENABLED:
+        return parse(await coro_factory())
+
+    value = cache_get(key)
+    if value is not None:
+        try:
+            return parse(value)
+        except ValueError:
+            cache_delete(key)
+
+    value = await coro_factory()
+    cache_set(key, value)
+    return parse(value)
+
+
+def clear_cache():
+    """Drop all cached VLM responses."""
+    _memory_cache.clear()
+    _get_disk_cache().clear()
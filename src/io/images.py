@@ -0,0 +1,139 @@
+"""Image loading helpers shared by classification and extraction."""
+
+import asyncio
+import base64
+import io
+import mmap
+import os
+import stat
+import struct
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image
+
+IMAGE_HEAD_BYTES = 65536  # Enough for the SOF segment of MinerU crops (no large EXIF/ICC)
+# How images are attached to VLM requests:
+#   "base64"   - inline data URL (works with any OpenAI-compatible server)
+#   "file_url" - file:// URL, no read/encode; the server must share the filesystem
+#                and allow local media (vLLM: --allowed-local-media-path)
+IMAGE_TRANSPORT = "base64"
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic...)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers without a length field
+_JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+
+def _encode_file_b64(img_path: Path) -> str:
+    """Base64-encode a file straight from an mmap view (no intermediate bytes copy)."""
+    with open(img_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""  # mmap can't map an empty file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return base64.b64encode(mm).decode('ascii')
+
+
+def load_image_b64(img_path: Path) -> Optional[str]:
+    """Load image as base64 string."""
+    if img_path.exists():
+        return _encode_file_b64(img_path)
+    return None
+
+
+def _load_file_b64(img_path: Path) -> Optional[str]:
+    if not img_path.is_file():
+        return None
+    return _encode_file_b64(img_path)
+
+
+async def load_image_b64_async(img_path: Path) -> Optional[str]:
+    """Load image as base64 string (None if not a file) without blocking the event loop."""
+    return await asyncio.to_thread(_load_file_b64, img_path)
+
+
+def _file_url_and_key(img_path: Path) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        st = img_path.stat()
+    except OSError:
+        return None, None
+    if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+        return None, None
+    url = img_path.resolve().as_uri()
+    # Size + mtime stand in for the content in cache keys (merged images are rewritten in place)
+    return url, f"{url}:{st.st_size}:{st.st_mtime_ns}"
+
+
+async def load_image_url_async(img_path: Path) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Image URL for a chat message, per IMAGE_TRANSPORT.
+    
+    Returns:
+        (url, cache_key_part): (None, None) if the image is missing or empty.
+        For base64 the key part is the encoded image, as before.
+    """
+    if IMAGE_TRANSPORT == "file_url":
+        return await asyncio.to_thread(_file_url_and_key, img_path)
+    img_b64 = await load_image_b64_async(img_path)
+    if not img_b64:
+        return None, None
+    return f"data:image/jpeg;base64,{img_b64}", img_b64
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the SOF segment of an open JPEG file, or None."""
+    if f.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # Fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in _JPEG_STANDALONE_MARKERS:
+            continue
+        if code == 0xD9:  # End of image
+            return None
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack(">H", header)[0]
+        if code in _JPEG_SOF_MARKERS:
+            sof = f.read(5)
+            if len(sof) < 5:
+                return None
+            height, width = struct.unpack(">xHH", sof)
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def image_size(img_path: Path) -> Tuple[int, int]:
+    """
+    Get (width, height) without decoding pixels.
+    
+    Reads only the first IMAGE_HEAD_BYTES: JPEGs are answered from the SOF
+    header, other formats by PIL on the in-memory head. The whole file is
+    opened only if the header lies beyond that.
+    """
+    with open(img_path, 'rb') as f:
+        head = f.read(IMAGE_HEAD_BYTES)
+    
+    if head[:2] == b"\xff\xd8":
+        size = _jpeg_size(io.BytesIO(head))
+        if size is not None:
+            return size
+    else:
+        try:
+            with Image.open(io.BytesIO(head)) as img:
+                return img.size
+        except (OSError, SyntaxError):
+            pass
+    
+    with Image.open(img_path) as img:
+        return img.size
@@ -1,10 +1,20 @@
 """Save classification and extraction results to JSON files."""
 
-import json
 from pathlib import Path
 from datetime import datetime
 from typing import Any
 
+import orjson
+from pydantic import TypeAdapter
+
+from ..vlm.schemas import SummaryCompensationTable
+
+# Pretty output like json.dump(indent=2); numpy values and non-str keys as json did
+ORJSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Dumps a whole list of extracted tables in one compiled call
+_SCT_LIST_ADAPTER = TypeAdapter(list[SummaryCompensationTable])
+
 
 def json_serial(obj: Any) -> str:
     """JSON serializer for objects not serializable by default."""
@@ -13,6 +23,11 @@ def json_serial(obj: Any) -> str:
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
+def _write_json(save_path: Path, results: dict):
+    """Write results as indented UTF-8 JSON."""
+    save_path.write_bytes(orjson.dumps(results, option=ORJSON_OPTIONS, default=json_serial))
+
+
 def save_classification_results(
     found_tables: list[dict],
     output_path: Path,
@@ -40,8 +55,7 @@ def save_classification_results(
     }
     
     save_path = output_path / "classification_results.json"
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, default=json_serial)
+    _write_json(save_path, results)
     
     print(f"💾 Classification results saved to: {save_path}")
     return save_path
@@ -71,8 +85,7 @@ def save_no_sct_results(
     }
     
     save_path = output_path / "no_sct_found.json"
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, default=json_serial)
+    _write_json(save_path, results)
     
     return save_path
 
@@ -86,7 +99,8 @@ def save_extraction_results(
     Save extraction results to JSON.
     
     Args:
-        extracted_data: List of extracted SummaryCompensationTable data
+        extracted_data: List of extracted SummaryCompensationTable data, aligned
+            with the classified tables (None = failed extraction, saved as null)
         output_path: Directory where to save the results
         metadata: Optional additional metadata to include
         
@@ -97,25 +111,28 @@ def save_extraction_results(
     output_path.mkdir(parents=True, exist_ok=True)
     
     # Convert Pydantic models to dicts if needed
-    serializable_data = []
-    for item in extracted_data:
-        if hasattr(item, 'model_dump'):
-            serializable_data.append(item.model_dump())
-        elif isinstance(item, dict):
-            serializable_data.append(item)
-        else:
-            serializable_data.append(str(item))
+    if all(isinstance(item, SummaryCompensationTable) for item in extracted_data):
+        serializable_data = _SCT_LIST_ADAPTER.dump_python(extracted_data, mode='json')
+    else:
+        # Mixed input: per-item fallback
+        serializable_data = []
+        for item in extracted_data:
+            if hasattr(item, 'model_dump'):
+                serializable_data.append(item.model_dump())
+            elif isinstance(item, dict) or item is None:
+                serializable_data.append(item)
+            else:
+                serializable_data.append(str(item))
     
     results = {
         "timestamp": datetime.now().isoformat(),
-        "total_extracted": len(serializable_data),
+        "total_extracted": sum(item is not None for item in serializable_data),
         "metadata": metadata or {},
         "data": serializable_data
     }
     
     save_path = output_path / "extraction_results.json"
-    with open(save_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, default=json_serial)
+    _write_json(save_path, results)
     
     print(f"💾 Extraction results saved to: {save_path}")
     return save_path
@@ -3,24 +3,51 @@
 from pathlib import Path
 from typing import Any, Optional
 from IPython.display import display, HTML, Markdown
-import json
+import orjson
 
 # ============== CONFIGURATION ==============
 DISPLAY_MAX_WIDTH = 1000
 PREVIEW_MAX_WIDTH = 800
 
 
+def _load_display_image(pil_image_class: Any, img_path: Path, max_width: int):
+    """
+    Open an image downscaled to max_width.
+    
+    draft() lets the JPEG decoder return a pre-reduced image (DCT scaling),
+    so large table crops are never decoded at native resolution.
+    """
+    img = pil_image_class.open(img_path)
+    if img.width > max_width:
+        size = (max_width, max(1, int(img.height * max_width / img.width)))
+        img.draft("RGB", size)
+        img.thumbnail(size, pil_image_class.Resampling.LANCZOS)
+    return img
+
+
+def _vlm_dir(base_path: Path, source_doc: str) -> Path:
+    """MinerU vlm directory of a document (images are relative to it)."""
+    return base_path / "output" / source_doc / source_doc / "vlm"
+
+
 def display_extraction_result(
     extracted_item: Any,
     found_table: dict,
     metadata: dict,
     base_path: Path,
-    pil_image_class: Any = None
+    pil_image_class: Any = None,
+    vlm_dir: Optional[Path] = None,
+    image_cache: Optional[dict] = None
 ) -> None:
     """
     Display a single extraction result with image, JSON, and links.
+    
+    vlm_dir: precomputed document vlm directory (derived from base_path if None)
+    image_cache: optional {path: image} dict shared across calls
     """
     source_doc = found_table['table']['source_doc']
+    if vlm_dir is None:
+        vlm_dir = _vlm_dir(base_path, source_doc)
     
     # Links
     filing_index = metadata.get('filing_html_index', '')
@@ -37,12 +64,13 @@ def display_extraction_result(
     # Image
     img_path = found_table['table'].get('img_path', '')
     if img_path and pil_image_class:
-        full_img_path = base_path / "output" / source_doc / source_doc / "vlm" / img_path
-        if full_img_path.exists():
-            img = pil_image_class.open(full_img_path)
-            if img.width > DISPLAY_MAX_WIDTH:
-                ratio = DISPLAY_MAX_WIDTH / img.width
-                img = img.resize((DISPLAY_MAX_WIDTH, int(img.height * ratio)))
+        full_img_path = vlm_dir / img_path
+        img = image_cache.get(full_img_path) if image_cache is not None else None
+        if img is None and full_img_path.exists():
+            img = _load_display_image(pil_image_class, full_img_path, DISPLAY_MAX_WIDTH)
+            if image_cache is not None:
+                image_cache[full_img_path] = img
+        if img is not None:
             display(img)
     
     # JSON
@@ -56,7 +84,7 @@ def display_extraction_result(
     json_html = f"""
     <pre style="background: #1e1e1e; color: #d4d4d4; padding: 15px; 
                 border-radius: 5px; overflow-x: auto; font-size: 12px;">
-{json.dumps(data, indent=2, ensure_ascii=False)}
+{orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()}
     </pre>
     """
     display(HTML(json_html))
@@ -70,14 +98,26 @@ def display_all_results(
     pil_image_class: Any = None
 ) -> None:
     """Display all extraction results."""
+    vlm_dirs = {}  # source_doc -> vlm dir, computed once per document
+    image_cache = {}
     for i, (extracted, found) in enumerate(zip(extracted_list, found_tables)):
+        source_doc = found['table']['source_doc']
+        if source_doc not in vlm_dirs:
+            vlm_dirs[source_doc] = _vlm_dir(base_path, source_doc)
+        
         display(HTML(f"<h3>Table {i + 1}</h3>"))
+        if extracted is None:
+            # Extraction failed after retries (placeholder from extract_all_summary_compensation)
+            display(HTML("<p>⚠️ Extraction failed</p><hr/>"))
+            continue
         display_extraction_result(
             extracted_item=extracted,
             found_table=found,
             metadata=metadata,
             base_path=base_path,
-            pil_image_class=pil_image_class
+            pil_image_class=pil_image_class,
+            vlm_dir=vlm_dirs[source_doc],
+            image_cache=image_cache
         )
         display(HTML("<hr/>"))
 
@@ -86,7 +126,8 @@ def display_table_preview(
     table: dict,
     base_path: Path,
     pil_image_class: Any = None,
-    show_html: bool = False
+    show_html: bool = False,
+    vlm_dir: Optional[Path] = None
 ) -> None:
     """
     Quick preview of a single table (image + optional HTML).
@@ -96,6 +137,7 @@ def display_table_preview(
         base_path: Base path
         pil_image_class: PIL.Image class
         show_html: Whether to show the HTML table body
+        vlm_dir: Precomputed document vlm directory (derived from base_path if None)
     """
     source_doc = table.get('source_doc', '')
     img_path = table.get('img_path', '')
@@ -108,12 +150,9 @@ def display_table_preview(
     """))
     
     if img_path and pil_image_class:
-        full_path = base_path / "output" / source_doc / source_doc / "vlm" / img_path
+        full_path = (vlm_dir or _vlm_dir(base_path, source_doc)) / img_path
         if full_path.exists():
-            img = pil_image_class.open(full_path)
-            if img.width > PREVIEW_MAX_WIDTH:
-                ratio = PREVIEW_MAX_WIDTH / img.width
-                img = img.resize((PREVIEW_MAX_WIDTH, int(img.height * ratio)))
+            img = _load_display_image(pil_image_class, full_path, PREVIEW_MAX_WIDTH)
             display(img)
     
     if show_html:
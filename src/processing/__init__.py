@@ -1,6 +1,6 @@
 # Processing module - PDF conversion, MinerU processing, table extraction
 
 from .pdf_conversion import get_doc_id, convert_docs_to_pdf
-from .mineru_processing import process_pdfs_with_mineru
-from .table_extraction import extract_tables_from_output, merge_consecutive_tables
-from .orphan_fix import fix_orphan_images, fix_all_orphan_images, get_scale_factors
+from .mineru_processing import process_pdfs_with_mineru, find_content_list
+from .table_extraction import extract_tables_from_output, merge_consecutive_tables, group_tables_by_doc
+from .orphan_fix import fix_orphan_images, fix_all_orphan_images, get_scale_factors, build_doc_index
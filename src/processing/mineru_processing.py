@@ -1,8 +1,12 @@
+import base64
+import binascii
 import subprocess
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import threading
+from typing import Optional
+import httpx
 
 # ============== CONFIGURATION ==============
 PDFS_DIR = "pdfs"
@@ -11,12 +15,32 @@ MINERU_BACKEND = "vlm-http-client"
 MINERU_URL = "http://localhost:30000"
 MINERU_LANG = "en"  # English for SEC documents
 DEFAULT_MAX_CONCURRENT = 8  # Reduced from higher values for better throughput
+# MinerU API server (`mineru-api`). When set, PDFs are posted over HTTP instead of
+# launching one `mineru` CLI process per PDF. None = use the CLI.
+MINERU_API_URL = None  # e.g. "http://localhost:8001"
+MINERU_API_TIMEOUT = 1800  # Seconds per PDF
+# Backend subfolders where MinerU writes <doc>/<doc>/<subdir>/<doc>_content_list.json
+MINERU_OUTPUT_SUBDIRS = ("vlm", "auto")
+
+
+def find_content_list(output_dir: Path) -> Optional[Path]:
+    """
+    Locate a document's *_content_list.json.
+    
+    Tries the known MinerU layouts first (one stat each), then falls back
+    to a recursive search for unexpected layouts.
+    """
+    name = output_dir.name
+    for subdir in MINERU_OUTPUT_SUBDIRS:
+        candidate = output_dir / name / subdir / f"{name}_content_list.json"
+        if candidate.is_file():
+            return candidate
+    return next(output_dir.rglob("*_content_list.json"), None)
 
 
 def is_mineru_processed(output_dir: Path) -> bool:
     """Check if MinerU has already processed this document."""
-    content_files = list(output_dir.rglob("*_content_list.json"))
-    return len(content_files) > 0
+    return find_content_list(output_dir) is not None
 
 
 def process_pdf(pdf_path, output_base: Path, semaphore: threading.Semaphore):
@@ -53,6 +77,68 @@ def process_pdf(pdf_path, output_base: Path, semaphore: threading.Semaphore):
         return 'success', pdf_path.name, None
 
 
+def _write_api_result(result: dict, vlm_dir: Path, stem: str):
+    """Write a /file_parse result using the same layout as the MinerU CLI."""
+    images_dir = vlm_dir / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    
+    for name, data_uri in (result.get("images") or {}).items():
+        b64 = data_uri.split(",", 1)[-1]
+        (images_dir / name).write_bytes(base64.b64decode(b64))
+    
+    if result.get("md_content"):
+        (vlm_dir / f"{stem}.md").write_text(result["md_content"], encoding="utf-8")
+    
+    # Written last: its presence marks the document as processed
+    (vlm_dir / f"{stem}_content_list.json").write_text(result["content_list"], encoding="utf-8")
+
+
+def process_pdf_http(pdf_path, output_base: Path, semaphore: threading.Semaphore, session: httpx.Client):
+    """Process single PDF through the MinerU API server (no subprocess).
+    
+    Args:
+        pdf_path: Path to PDF file
+        output_base: Base output directory
+        semaphore: Semaphore to limit concurrent requests
+        session: Shared HTTP client (connection reuse across PDFs)
+    
+    Returns:
+        tuple: (status, name, error_msg)
+    """
+    output_dir = output_base / pdf_path.stem
+    
+    if is_mineru_processed(output_dir):
+        return 'skipped', pdf_path.name, None
+    
+    with semaphore:
+        try:
+            with open(pdf_path, 'rb') as f:
+                r = session.post(
+                    f"{MINERU_API_URL}/file_parse",
+                    files=[("files", (pdf_path.name, f, "application/pdf"))],
+                    data={
+                        "backend": MINERU_BACKEND,
+                        "server_url": MINERU_URL,
+                        "lang_list": [MINERU_LANG],
+                        "return_md": "true",
+                        "return_content_list": "true",
+                        "return_images": "true",
+                    },
+                )
+            r.raise_for_status()
+            result = r.json()["results"][pdf_path.stem]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            return 'failed', pdf_path.name, str(e)[:200] or "Unknown error"
+    
+    # Outside the semaphore (disk only). A failed write leaves no content_list.json,
+    # so the document is retried on the next run.
+    try:
+        _write_api_result(result, output_dir / pdf_path.stem / "vlm", pdf_path.stem)
+    except (KeyError, TypeError, ValueError, OSError, binascii.Error) as e:
+        return 'failed', pdf_path.name, str(e)[:200] or "Unknown error"
+    return 'success', pdf_path.name, None
+
+
 def process_pdfs_with_mineru(base_path: Path = None, max_concurrent: int = DEFAULT_MAX_CONCURRENT, doc_ids: list = None):
     """Process PDFs with MinerU.
     
@@ -113,21 +199,33 @@ def process_pdfs_with_mineru(base_path: Path = None, max_concurrent: int = DEFAU
     if not to_process:
         return failed, success
     
+    session = httpx.Client(timeout=MINERU_API_TIMEOUT) if MINERU_API_URL else None
+    
     # Use more workers than semaphore allows - they'll queue up waiting for semaphore
-    with ThreadPoolExecutor(max_workers=len(to_process)) as executor:
-        futures = {
-            executor.submit(process_pdf, pdf, output_base, semaphore): pdf 
-            for pdf in to_process
-        }
+    try:
+        with ThreadPoolExecutor(max_workers=len(to_process)) as executor:
+            if session is not None:
+                futures = {
+                    executor.submit(process_pdf_http, pdf, output_base, semaphore, session): pdf
+                    for pdf in to_process
+                }
+            else:
+                futures = {
+                    executor.submit(process_pdf, pdf, output_base, semaphore): pdf 
+                    for pdf in to_process
+                }
         
-        for future in tqdm(as_completed(futures), total=len(to_process)):
-            status, name, error = future.result()
-            # Remove .pdf extension to get doc_id
-            doc_id = name.replace('.pdf', '') if name.endswith('.pdf') else name
-            if status == 'failed':
-                failed.append((doc_id, error))
-            elif status == 'success':
-                success.append(doc_id)
+            for future in tqdm(as_completed(futures), total=len(to_process)):
+                status, name, error = future.result()
+                # Remove .pdf extension to get doc_id
+                doc_id = name.replace('.pdf', '') if name.endswith('.pdf') else name
+                if status == 'failed':
+                    failed.append((doc_id, error))
+                elif status == 'success':
+                    success.append(doc_id)
+    finally:
+        if session is not None:
+            session.close()
     
     print(f"\n=== Processing Complete ===")
     print(f"Success: {len(success)} (including {len(skipped)} already processed)")
@@ -1,11 +1,59 @@
 # Fix for orphan images in MinerU output
 # MinerU sometimes generates images but doesn't link them in the JSON
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Dict, Tuple, List
-from PIL import Image
-import json
-import statistics
+from typing import Dict, Tuple, List, Optional
+import os
+import orjson
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from ..io.images import image_size
+from .mineru_processing import find_content_list
+
+# ============== CONFIGURATION ==============
+PROCESS_POOL_MIN_DOCS = 32  # Below this, threads are cheaper than spawning processes
+UNMATCHABLE_COST = 1e9  # Assignment cost for pairs above the matching threshold
+NUMBA_MIN_PAIRS = 250_000  # Table x orphan pairs above which the compiled kernel is used
+
+
+def extract_bboxes(items: List[dict]) -> np.ndarray:
+    """
+    Stack item bboxes into an N x 4 array (x0, y0, x1, y1).
+    
+    Items with a missing or short bbox get a NaN row: NaN fails every
+    comparison, so invalid rows drop out of the bulk masks.
+    """
+    bboxes = np.full((len(items), 4), np.nan)
+    for row, item in enumerate(items):
+        bbox = item.get('bbox')
+        if bbox and len(bbox) >= 4:
+            bboxes[row] = bbox[:4]
+    return bboxes
+
+
+def _scale_factors_from_linked(linked: List[dict], vlm_dir: Path) -> Tuple[float, float]:
+    """Median image/bbox scale over tables that already have img_path."""
+    bboxes = extract_bboxes(linked)
+    wh = bboxes[:, 2:4] - bboxes[:, 0:2]
+    valid = (wh > 0).all(axis=1)
+    
+    bbox_wh = []
+    img_wh = []
+    for row in np.flatnonzero(valid):
+        img_path = vlm_dir / linked[row]['img_path']
+        if not img_path.exists():
+            continue
+        img_wh.append(image_size(img_path))
+        bbox_wh.append(wh[row])
+    
+    if img_wh:
+        scales = np.asarray(img_wh, dtype=np.float64) / np.asarray(bbox_wh)
+        scale_w, scale_h = np.median(scales, axis=0)
+        return float(scale_w), float(scale_h)
+    return 1.65, 2.34  # Default fallback (typical values)
 
 
 def get_scale_factors(content: list, vlm_dir: Path) -> Tuple[float, float]:
@@ -19,141 +67,170 @@ def get_scale_factors(content: list, vlm_dir: Path) -> Tuple[float, float]:
     Returns:
         (scale_w, scale_h): Scale factors for width and height
     """
-    scale_ws = []
-    scale_hs = []
+    linked = [item for item in content if item.get('type') == 'table' and item.get('img_path')]
+    return _scale_factors_from_linked(linked, vlm_dir)
+
+
+def build_doc_index(output_path: Path) -> Dict[str, Tuple[Path, List[str]]]:
+    """
+    Scan the output directory once and index every document.
     
-    for item in content:
-        if item.get('type') == 'table' and item.get('img_path'):
-            bbox = item.get('bbox', [])
-            if not bbox or len(bbox) < 4:
-                continue
-            
-            bbox_w = bbox[2] - bbox[0]
-            bbox_h = bbox[3] - bbox[1]
-            
-            if bbox_w <= 0 or bbox_h <= 0:
-                continue
-            
-            img_path = vlm_dir / item['img_path']
-            if not img_path.exists():
-                continue
-            
-            img = Image.open(img_path)
-            img_w, img_h = img.size
-            
-            scale_ws.append(img_w / bbox_w)
-            scale_hs.append(img_h / bbox_h)
+    Returns:
+        {doc_name: (content_list_path, sorted .jpg names in vlm/images)}
+    """
+    content_paths = {}
+    jpgs_by_dir = {}
     
-    if scale_ws and scale_hs:
-        return statistics.median(scale_ws), statistics.median(scale_hs)
-    return 1.65, 2.34  # Default fallback (typical values)
+    for root, dirs, files in os.walk(output_path):
+        dirs.sort()
+        root_path = Path(root)
+        jpgs = sorted(f for f in files if f.endswith('.jpg'))
+        if jpgs:
+            jpgs_by_dir[root_path] = jpgs
+        
+        parts = root_path.relative_to(output_path).parts
+        if not parts:
+            continue
+        for f in sorted(files):
+            if f.endswith('_content_list.json'):
+                content_paths.setdefault(parts[0], root_path / f)
+                break
+    
+    return {
+        doc: (content_path, jpgs_by_dir.get(content_path.parent / "images", []))
+        for doc, content_path in content_paths.items()
+    }
 
 
-def fix_orphan_images(doc_dir: Path, threshold: float = 50, dry_run: bool = False) -> Dict:
+def fix_orphan_images(doc_dir: Path, threshold: float = 50, dry_run: bool = False,
+                      index_entry: Optional[Tuple[Optional[Path], List[str]]] = None) -> Dict:
     """
     Find and match orphan images to tables without img_path.
     
     Algorithm:
     1. Calculate scale factors from already-linked tables
     2. For each table without img_path, calculate expected image dimensions
-    3. Match with the orphan image that has closest dimensions (error < threshold)
+    3. Assign orphan images to tables minimizing the total dimension error
+       (Hungarian algorithm), keeping only pairs with error < threshold
     
     Args:
         doc_dir: Document directory (output/doc_name/)
         threshold: Maximum error in pixels to consider a valid match
         dry_run: If True, don't modify files but show what would be done
+        index_entry: Entry from build_doc_index() to skip scanning doc_dir
     
     Returns:
         Dict with fix statistics
     """
-    content_files = list(doc_dir.rglob("*_content_list.json"))
-    if not content_files:
+    if index_entry is None:
+        content_path = find_content_list(doc_dir)
+        image_names = None
+    else:
+        content_path, image_names = index_entry
+    
+    if content_path is None:
         return {'status': 'no_content_list', 'fixed': 0}
     
-    vlm_dir = content_files[0].parent
+    vlm_dir = content_path.parent
     images_dir = vlm_dir / "images"
     
     if not images_dir.exists():
         return {'status': 'no_images_dir', 'fixed': 0}
     
-    with open(content_files[0]) as f:
-        content = json.load(f)
+    content = orjson.loads(content_path.read_bytes())
     
-    # Calculate scale factors
-    scale_w, scale_h = get_scale_factors(content, vlm_dir)
-    
-    # Find tables without img_path
-    tables_no_img = [(i, item) for i, item in enumerate(content) 
-                     if item.get('type') == 'table' and not item.get('img_path')]
+    # Single pass over content: linked tables (for scale factors),
+    # tables without img_path, and image names already in use
+    linked = []
+    tables_no_img = []
+    used_images = set()
+    for i, item in enumerate(content):
+        ip = item.get('img_path')
+        if ip:
+            used_images.add(ip.rsplit('/', 1)[-1])
+        if item.get('type') != 'table':
+            continue
+        if ip:
+            linked.append(item)
+        else:
+            tables_no_img.append((i, item))
     
     if not tables_no_img:
         return {'status': 'no_tables_to_fix', 'fixed': 0}
     
     # Find orphan images
-    used_images = set(Path(item.get('img_path', '')).name for item in content if item.get('img_path'))
-    orphan_paths = [f for f in sorted(images_dir.glob("*.jpg")) if f.name not in used_images]
+    if image_names is None:
+        with os.scandir(images_dir) as entries:
+            image_names = sorted(e.name for e in entries if e.name.endswith('.jpg'))
+    orphan_names = [name for name in image_names if name not in used_images]
     
-    if not orphan_paths:
+    if not orphan_names:
         return {'status': 'no_orphan_images', 'fixed': 0, 'tables_no_img': len(tables_no_img)}
     
+    # Calculate scale factors (only now: reads the linked images' headers)
+    scale_w, scale_h = _scale_factors_from_linked(linked, vlm_dir)
+    
     # Pre-load orphan image sizes
-    orphan_sizes = {}
-    for img_path in orphan_paths:
-        img = Image.open(img_path)
-        orphan_sizes[img_path] = img.size
+    images_dir_str = str(images_dir)
+    orphan_sizes = [image_size(os.path.join(images_dir_str, name)) for name in orphan_names]
+    
+    # Expected size per table (T x 2) vs actual orphan sizes (O x 2)
+    bboxes = extract_bboxes([t for _, t in tables_no_img])
+    has_bbox = ~np.isnan(bboxes).any(axis=1)
+    candidates = [tables_no_img[row] for row in np.flatnonzero(has_bbox)]
     
-    # Matching
     matches = []
-    used_orphans = set()
     errors = []
     
-    for idx, t in tables_no_img:
-        bbox = t.get('bbox', [])
-        if not bbox or len(bbox) < 4:
-            continue
+    if candidates:
+        expected = (bboxes[has_bbox, 2:4] - bboxes[has_bbox, 0:2]) * (scale_w, scale_h)
+        actual = np.asarray(orphan_sizes, dtype=np.float64)
         
-        bbox_w = bbox[2] - bbox[0]
-        bbox_h = bbox[3] - bbox[1]
-        expected_w = bbox_w * scale_w
-        expected_h = bbox_h * scale_h
+        # L1 error for every (table, orphan) pair in one vectorized pass
+        if len(expected) * len(actual) >= NUMBA_MIN_PAIRS:
+            # Imported lazily: numba import + JIT load only pay off on huge documents
+            from .orphan_kernels import pairwise_l1
+            err = pairwise_l1(expected, actual)
+        else:
+            err = np.abs(expected[:, None, :] - actual[None, :, :]).sum(-1)
         
-        # Find best match not yet used
-        best_match = None
-        best_error = float('inf')
+        # Globally optimal assignment (min total error). Pairs over threshold
+        # get a prohibitive cost so they never displace a valid match.
+        if err.shape[0] == 1 or err.shape[1] == 1:
+            # Single table or single orphan: the optimum is just the argmin
+            flat = int(err.argmin())
+            rows, cols = np.unravel_index([flat], err.shape)
+        else:
+            cost = np.where(err < threshold, err, UNMATCHABLE_COST)
+            rows, cols = linear_sum_assignment(cost)
         
-        for img_path in orphan_paths:
-            if img_path in used_orphans:
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            best_error = float(err[row, col])
+            if best_error >= threshold:
                 continue
-            img_w, img_h = orphan_sizes[img_path]
-            error = abs(img_w - expected_w) + abs(img_h - expected_h)
             
-            if error < best_error:
-                best_error = error
-                best_match = img_path
-        
-        if best_match and best_error < threshold:
+            idx, t = candidates[row]
+            best_match = orphan_names[col]
             matches.append({
                 'table_idx': idx,
                 'page': t.get('page_idx'),
-                'img_path': f"images/{best_match.name}",
+                'img_path': f"images/{best_match}",
                 'error': best_error
             })
-            used_orphans.add(best_match)
             errors.append(best_error)
             
             # Apply fix
             if not dry_run:
-                content[idx]['img_path'] = f"images/{best_match.name}"
+                content[idx]['img_path'] = f"images/{best_match}"
     
     # Save if not dry_run
     if not dry_run and matches:
-        with open(content_files[0], 'w') as f:
-            json.dump(content, f, indent=2, ensure_ascii=False)
+        content_path.write_bytes(orjson.dumps(content, option=orjson.OPT_INDENT_2))
     
     return {
         'status': 'ok',
         'tables_no_img': len(tables_no_img),
-        'orphan_images': len(orphan_paths),
+        'orphan_images': len(orphan_names),
         'fixed': len(matches),
         'unmatched': len(tables_no_img) - len(matches),
         'avg_error': sum(errors)/len(errors) if errors else 0,
@@ -163,14 +240,25 @@ def fix_orphan_images(doc_dir: Path, threshold: float = 50, dry_run: bool = Fals
     }
 
 
-def fix_all_orphan_images(output_path: Path, threshold: float = 50, dry_run: bool = False) -> Dict:
+def _fix_indexed_doc(item: Tuple[Path, Tuple[Optional[Path], List[str]]], threshold: float, dry_run: bool) -> Dict:
+    """Pool worker: fix one (doc_dir, index_entry) pair."""
+    doc_dir, index_entry = item
+    return fix_orphan_images(doc_dir, threshold=threshold, dry_run=dry_run, index_entry=index_entry)
+
+
+def fix_all_orphan_images(output_path: Path, threshold: float = 50, dry_run: bool = False,
+                          max_workers: Optional[int] = None) -> Dict:
     """
     Apply orphan image fix to all documents in output directory.
     
+    Documents are independent, so they are fixed in parallel: a process
+    pool for large batches, a thread pool for small ones (mostly file I/O).
+    
     Args:
         output_path: Path to output directory containing doc folders
         threshold: Maximum error in pixels for matching
         dry_run: If True, simulate without modifying files
+        max_workers: Pool size (default: os.cpu_count())
     
     Returns:
         Dict with overall statistics
@@ -184,11 +272,23 @@ def fix_all_orphan_images(output_path: Path, threshold: float = 50, dry_run: boo
         'errors': []
     }
     
-    for doc_dir in sorted(output_path.iterdir()):
-        if not doc_dir.is_dir():
-            continue
-        
-        result = fix_orphan_images(doc_dir, threshold=threshold, dry_run=dry_run)
+    with os.scandir(output_path) as entries:
+        doc_dirs = sorted(Path(e.path) for e in entries if e.is_dir())
+    if not doc_dirs:
+        return stats
+    
+    # One walk for the whole tree instead of rglob/glob per document
+    index = build_doc_index(output_path)
+    items = [(d, index.get(d.name, (None, []))) for d in doc_dirs]
+    
+    max_workers = max_workers or os.cpu_count() or 1
+    executor_cls = ProcessPoolExecutor if len(doc_dirs) >= PROCESS_POOL_MIN_DOCS else ThreadPoolExecutor
+    fix_one = partial(_fix_indexed_doc, threshold=threshold, dry_run=dry_run)
+    
+    with executor_cls(max_workers=min(max_workers, len(doc_dirs))) as ex:
+        results = list(ex.map(fix_one, items))
+    
+    for doc_dir, result in zip(doc_dirs, results):
         stats['docs_processed'] += 1
         
         if result.get('fixed', 0) > 0:
@@ -0,0 +1,23 @@
+# Numba kernels for orphan image matching on very large documents
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def pairwise_l1(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """
+    L1 size error between every expected (T x 2) and actual (O x 2) image size.
+    
+    Same result as np.abs(expected[:, None] - actual[None]).sum(-1), without
+    allocating the T x O x 2 temporary; rows are computed in parallel.
+    """
+    n_tables = expected.shape[0]
+    n_orphans = actual.shape[0]
+    err = np.empty((n_tables, n_orphans))
+    for t in prange(n_tables):
+        exp_w = expected[t, 0]
+        exp_h = expected[t, 1]
+        for o in range(n_orphans):
+            err[t, o] = abs(exp_w - actual[o, 0]) + abs(exp_h - actual[o, 1])
+    return err
@@ -1,20 +1,53 @@
 # Logica per estrarre tabelle da MinerU output e trasformarle in JSON strutturato
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple, List, Dict
 from pathlib import Path
-import json
+import os
+import re
+import orjson
 from PIL import Image
 
+from ..io.images import image_size
+from .mineru_processing import find_content_list
 from ..vlm.schemas import TableType
 
 # ============== CONFIGURATION ==============
 MERGE_DISTANCE_THRESHOLD = 200  # Max pixel distance between tables to merge
 MERGE_PAGE_TOP_THRESHOLD = 150  # Max y position to consider table "at top of page"
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # Threads for scanning output dirs
+MERGED_JPEG_OPTIONS = {'quality': 95, 'subsampling': 0, 'optimize': False, 'progressive': False}
 
+_TABLE_TAG_RE = re.compile(r"</?table\b[^>]*>")
 
-def extract_tables_from_output(output_path: Path = Path("output"), save_path: str = "all_tables.json") -> Tuple[List[Dict], Dict]:
+
+def _scan_output_dir(output_dir: Path) -> Optional[List[Dict]]:
+    """Tables from a document's content_list.json, or None if MinerU produced none."""
+    content_path = find_content_list(output_dir)
+    if content_path is None:
+        return None
+    
+    data = orjson.loads(content_path.read_bytes())
+    return [item for item in data if item.get('type') == 'table']
+
+
+def _merged_image_is_current(merged_path: Path, sidecar_path: Path, sidecar: bytes, sources: List) -> bool:
+    """True if merged_path was written from exactly these sources and none changed since."""
+    try:
+        if sidecar_path.read_bytes() != sidecar:
+            return False
+        merged_mtime = merged_path.stat().st_mtime
+        return all(src.stat().st_mtime <= merged_mtime for src, _ in sources)
+    except OSError:
+        return False
+
+
+def extract_tables_from_output(output_path: Path = Path("output"), save_path: str = "all_tables.json", stream: bool = True) -> Tuple[List[Dict], Dict]:
     """Extract all tables from MinerU output.
     
+    With stream=True, save_path is written one table at a time (same JSON
+    array), so serialization never holds a second full copy of the corpus.
+    
     Returns:
         Tuple of (all_tables, stats) where stats contains processing details
     """
@@ -28,23 +61,22 @@ def extract_tables_from_output(output_path: Path = Path("output"), save_path: st
         'with_tables': [],    # Docs with at least 1 table
     }
 
-    all_dirs = [d for d in output_path.iterdir() if d.is_dir()]
+    # scandir: is_dir() answered from the directory entry, no extra stat per folder
+    with os.scandir(output_path) as entries:
+        all_dirs = [Path(e.path) for e in entries if e.is_dir()]
     stats['total_dirs'] = len(all_dirs)
     
-    for output_dir in all_dirs:
-        content_files = list(output_dir.rglob("*_content_list.json"))
-        
-        if not content_files:
+    # Scan + parse in threads (I/O bound), aggregate here in directory order
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        scanned = list(executor.map(_scan_output_dir, all_dirs))
+    
+    for output_dir, tables in zip(all_dirs, scanned):
+        if tables is None:
             stats['no_mineru_output'].append(output_dir.name)
             continue
         
         stats['processed'].append(output_dir.name)
         
-        with open(content_files[0]) as f:
-            data = json.load(f)
-        
-        tables = [item for item in data if item.get('type') == 'table']
-        
         if len(tables) == 0:
             stats['no_tables'].append(output_dir.name)
         else:
@@ -77,13 +109,29 @@ def extract_tables_from_output(output_path: Path = Path("output"), save_path: st
             print(f"    - {doc}")
 
     # Save all tables
-    with open(save_path, "w") as f:
-        json.dump(all_tables, f, indent=2)
+    with open(save_path, "wb") as f:
+        if stream:
+            f.write(b"[")
+            for i, t in enumerate(all_tables):
+                f.write(b",\n" if i else b"\n")
+                f.write(orjson.dumps(t, option=orjson.OPT_INDENT_2))
+            f.write(b"\n]" if all_tables else b"]")
+        else:
+            f.write(orjson.dumps(all_tables, option=orjson.OPT_INDENT_2))
     
     return all_tables, stats
 
 
-def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_tables: list[dict], all_classifications: dict, debug: bool = False) -> list[dict]:
+def group_tables_by_doc(all_tables: List[Dict]) -> Dict[str, List[Dict]]:
+    """Group tables by source_doc in one pass (build once, reuse for every document)."""
+    tables_by_doc = {}
+    for t in all_tables:
+        tables_by_doc.setdefault(t.get('source_doc'), []).append(t)
+    return tables_by_doc
+
+
+def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_tables: list[dict], all_classifications: dict, debug: bool = False,
+                             tables_by_doc: Optional[Dict[str, List[Dict]]] = None) -> list[dict]:
     """
     Merge tables split across pages using header detection.
     
@@ -97,8 +145,10 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
         found: List of classified summary_compensation tables
         images_base_dir: Path to images directory
         all_tables: ALL tables from the document (to find adjacent non-classified tables)
-        all_classifications: Dict mapping (page_idx, bbox) -> classification for ALL tables
+        all_classifications: Dict mapping (page_idx, bbox) -> ClassificationRow for ALL tables
         debug: If True, print detailed merge information
+        tables_by_doc: Optional group_tables_by_doc(all_tables) output, avoids
+            rescanning all_tables when called once per document
     
     Returns:
         List with merged tables where applicable
@@ -110,10 +160,33 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
     source_doc = found[0]['table']['source_doc']
     
     # Get all tables from this document, sorted by page and vertical position
-    doc_tables = sorted(
-        [t for t in all_tables if t.get('source_doc') == source_doc],
-        key=lambda x: (x.get('page_idx', 0), x.get('bbox', [0, 0, 0, 0])[1])
-    )
+    if tables_by_doc is not None:
+        source_tables = tables_by_doc.get(source_doc, [])
+    else:
+        source_tables = [t for t in all_tables if t.get('source_doc') == source_doc]
+    # Read page_idx/bbox once per table, then sort indices by (page, top):
+    # the loops below index these parallel lists instead of calling .get()
+    no_bbox = [0, 0, 0, 0]
+    source_pages = [t.get('page_idx', 0) for t in source_tables]
+    source_bboxes = [t.get('bbox', no_bbox) for t in source_tables]
+    sort_keys = list(zip(source_pages, [bbox[1] for bbox in source_bboxes]))
+    order = sorted(range(len(source_tables)), key=sort_keys.__getitem__)
+    
+    doc_tables = [source_tables[i] for i in order]
+    doc_pages = [source_pages[i] for i in order]
+    doc_bboxes = [source_bboxes[i] for i in order]
+    
+    # (page_idx, bbox) -> position in doc_tables (first occurrence, as the linear scan did)
+    idx_map = {}
+    for i, dt in enumerate(doc_tables):
+        idx_map.setdefault((dt.get('page_idx'), tuple(dt.get('bbox') or ())), i)
+    
+    # Merge geometry, computed once per document instead of once per candidate
+    doc_tops = [bbox[1] for bbox in doc_bboxes]
+    doc_bottoms = [bbox[3] for bbox in doc_bboxes]
+    doc_at_page_top = [top < MERGE_PAGE_TOP_THRESHOLD for top in doc_tops]
+    # all_classifications keys, built once instead of a tuple per candidate
+    doc_keys = [(page, tuple(bbox)) for page, bbox in zip(doc_pages, doc_bboxes)]
     
     merged_results = []
     processed_indices = set()
@@ -143,12 +216,7 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
         header_bottom = header_bbox[3]  # y2 coordinate (bottom of header)
         
         # Find the index of this table in all doc_tables
-        header_idx_in_doc = None
-        for i, dt in enumerate(doc_tables):
-            if (dt.get('page_idx') == header_page and 
-                dt.get('bbox') == header_bbox):
-                header_idx_in_doc = i
-                break
+        header_idx_in_doc = idx_map.get((header_page, tuple(header_bbox)))
         
         if header_idx_in_doc is None:
             merged_results.append(f)
@@ -169,15 +237,14 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
         # Look at subsequent tables in doc_tables
         for next_idx in range(header_idx_in_doc + 1, len(doc_tables)):
             next_table = doc_tables[next_idx]
-            next_page = next_table.get('page_idx', 0)
-            next_bbox = next_table.get('bbox', [0, 0, 0, 0])
-            next_top = next_bbox[1]  # y1 coordinate (top of next table)
+            next_page = doc_pages[next_idx]
+            next_top = doc_tops[next_idx]  # y1 coordinate (top of next table)
             
             # Calculate vertical distance
             if next_page == last_merged_page:
                 # Same page: distance from bottom of last to top of next
                 distance = next_top - last_merged_bottom
-            elif next_page == last_merged_page + 1 and next_top < MERGE_PAGE_TOP_THRESHOLD:
+            elif next_page == last_merged_page + 1 and doc_at_page_top[next_idx]:
                 # Next page, table at top: consider it close
                 distance = 0
             else:
@@ -193,9 +260,9 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
                 break
             
             # Look up classification from all_classifications
-            next_key = (next_page, tuple(next_bbox))
-            next_classification = all_classifications.get(next_key, {})
-            has_header = next_classification.get('has_header', True)  # Default True = stop
+            next_classification = all_classifications.get(doc_keys[next_idx])
+            # Default True = stop
+            has_header = True if next_classification is None else next_classification.has_header
             
             if debug:
                 print(f"   📋 Next table page {next_page}, distance={distance:.0f}px, has_header={has_header}")
@@ -209,7 +276,7 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
             # Add this table to merge list
             tables_to_merge.append(next_table)
             last_merged_page = next_page
-            last_merged_bottom = next_bbox[3]
+            last_merged_bottom = doc_bottoms[next_idx]
             if debug:
                 print(f"   ✅ Added to merge (has_header=False)")
         
@@ -220,7 +287,7 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
                 print(f"   ℹ️ No tables to merge, keeping as-is")
             merged_results.append(f)
         else:
-            # Merge images and HTML
+            # Merge images and HTML (images: only paths + header sizes for now)
             merged_images = []
             merged_html_parts = []
             
@@ -229,27 +296,38 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
                 if img_path_str:  # Skip empty paths
                     img_path = images_base_dir / img_path_str
                     if img_path.exists() and img_path.is_file():
-                        merged_images.append(Image.open(img_path))
+                        merged_images.append((img_path, image_size(img_path)))
                 
-                html = t.get('table_body', '')
-                # Remove table tags for concatenation
-                html = html.replace('<table>', '').replace('</table>', '')
-                merged_html_parts.append(html)
+                # Remove table tags for concatenation (one pass, also <table attr=...>)
+                merged_html_parts.append(_TABLE_TAG_RE.sub('', t.get('table_body', '')))
             
             # Combine images vertically
             if merged_images:
-                max_width = max(img.width for img in merged_images)
-                total_height = sum(img.height for img in merged_images)
-                combined_img = Image.new('RGB', (max_width, total_height), 'white')
-                
-                y_offset = 0
-                for img in merged_images:
-                    combined_img.paste(img, (0, y_offset))
-                    y_offset += img.height
-                
-                # Save merged image
+                max_width = max(w for _, (w, h) in merged_images)
+                total_height = sum(h for _, (w, h) in merged_images)
                 merged_name = f"merged_{f['index']}.jpg"
-                combined_img.save(images_base_dir / merged_name)
+                merged_path = images_base_dir / merged_name
+                
+                # Reuse the merged image from a previous run only if it was built from
+                # these exact sources (sidecar) with the current options, and is newer than them
+                sidecar_path = merged_path.with_suffix('.json')
+                sidecar = orjson.dumps({
+                    'sources': [[str(p.relative_to(images_base_dir)), w, h] for p, (w, h) in merged_images],
+                    'options': MERGED_JPEG_OPTIONS,
+                }, option=orjson.OPT_SORT_KEYS)
+                if not _merged_image_is_current(merged_path, sidecar_path, sidecar, merged_images):
+                    combined_img = Image.new('RGB', (max_width, total_height), 'white')
+                    
+                    # Decode one source at a time: peak memory is the canvas + one image
+                    y_offset = 0
+                    for img_path, (_, height) in merged_images:
+                        with Image.open(img_path) as img:
+                            combined_img.paste(img, (0, y_offset))
+                        y_offset += height
+                    
+                    # Save merged image (high quality, no chroma subsampling: input for extraction)
+                    combined_img.save(merged_path, **MERGED_JPEG_OPTIONS)
+                    sidecar_path.write_bytes(sidecar)
             else:
                 merged_name = header_table.get('img_path', '')
             
@@ -266,8 +344,8 @@ def merge_consecutive_tables(found: list[dict], images_base_dir: Path, all_table
             
             merged_results.append(merged_entry)
             
-            pages_merged = sorted(set(t.get('page_idx', 0) for t in tables_to_merge))
             if debug:
+                pages_merged = sorted({t.get('page_idx', 0) for t in tables_to_merge})
                 print(f"📎 Merged {len(tables_to_merge)} tables (pages {pages_merged})")
     
     return merged_results
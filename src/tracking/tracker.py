@@ -9,11 +9,18 @@ Usage:
     tracker.get_pending("classified")  # docs with mineru but no classification
 """
 
-import json
+import os
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
+from ..processing.mineru_processing import find_content_list
+
+REBUILD_WORKERS = 32  # Threads for rebuild_from_files (I/O bound)
+PHASE_ORDER = ["pdf_created", "mineru_done", "classified", "extracted"]
+
 
 class Tracker:
     def __init__(self, base_path: Path = None):
@@ -23,6 +30,13 @@ class Tracker:
         self.tracker_file = base_path / "pipeline_tracker.json"
         self.output_path = base_path / "output"
         self._data = None
+        # Indexes over documents, built once on load and kept in sync by the
+        # setters: get_pending/stats become set arithmetic instead of a full scan
+        self._phase_docs: Dict[str, set] = {}
+        self._status_docs: Dict[str, set] = {}
+        self._fund_docs = set()
+        # Changes not yet written to tracker_file
+        self._mutations = 0
     
     @property
     def data(self) -> dict:
@@ -33,16 +47,25 @@ class Tracker:
     def load(self):
         """Load tracker from file."""
         if self.tracker_file.exists():
-            with open(self.tracker_file) as f:
-                self._data = json.load(f)
+            self._data = orjson.loads(self.tracker_file.read_bytes())
         else:
             self._data = {"last_updated": None, "documents": {}}
+        self._build_index()
+        self._mutations = 0
     
     def save(self):
         """Save tracker to file."""
         self._data["last_updated"] = datetime.now().isoformat()
-        with open(self.tracker_file, "w") as f:
-            json.dump(self._data, f, indent=2)
+        self.tracker_file.write_bytes(orjson.dumps(self._data, option=orjson.OPT_INDENT_2))
+        self._mutations = 0
+    
+    def maybe_save(self, every: int = 100):
+        """Save only once at least `every` changes have accumulated (periodic checkpoint).
+        
+        Skips writes made through `data` directly: call save() after those.
+        """
+        if self._mutations >= every:
+            self.save()
     
     # -------------------------------------------------------------------------
     # Document operations
@@ -53,6 +76,10 @@ class Tracker:
         if doc_id in self.data["documents"]:
             return  # Already exists
         
+        self._mutations += 1
+        if metadata.get("sic") in ("NULL", None):
+            self._fund_docs.add(doc_id)
+        self._status_docs.setdefault("pending", set()).add(doc_id)
         self.data["documents"][doc_id] = {
             "cik": metadata.get("cik"),
             "company_name": metadata.get("company_name"),
@@ -69,12 +96,18 @@ class Tracker:
         return self.data["documents"].get(doc_id)
     
     def set_phase(self, doc_id: str, phase: str, timestamp: str = None):
-        """Mark a phase as complete for a document."""
-        if doc_id not in self.data["documents"]:
+        """Mark a phase as complete for a document (keeps the first timestamp on reruns)."""
+        doc = self.data["documents"].get(doc_id)
+        if doc is None:
+            return
+        phases = doc["phases"]
+        if phase in phases:
             return
         if timestamp is None:
             timestamp = datetime.now().isoformat()
-        self.data["documents"][doc_id]["phases"][phase] = timestamp
+        phases[phase] = timestamp
+        self._phase_docs.setdefault(phase, set()).add(doc_id)
+        self._mutations += 1
     
     def has_phase(self, doc_id: str, phase: str) -> bool:
         """Check if document has completed a phase."""
@@ -85,13 +118,19 @@ class Tracker:
     
     def set_status(self, doc_id: str, status: str):
         """Set final status: 'complete', 'no_sct', 'fund', 'pending'."""
-        if doc_id in self.data["documents"]:
-            self.data["documents"][doc_id]["status"] = status
+        doc = self.data["documents"].get(doc_id)
+        if doc is not None and doc.get("status", "pending") != status:
+            self._status_docs.get(doc.get("status", "pending"), set()).discard(doc_id)
+            self._status_docs.setdefault(status, set()).add(doc_id)
+            doc["status"] = status
+            self._mutations += 1
     
     def set_sct_tables(self, doc_id: str, table_paths: List[str]):
         """Set the SCT table image paths."""
-        if doc_id in self.data["documents"]:
-            self.data["documents"][doc_id]["sct_tables"] = table_paths
+        doc = self.data["documents"].get(doc_id)
+        if doc is not None and doc.get("sct_tables") != table_paths:
+            doc["sct_tables"] = table_paths
+            self._mutations += 1
     
     # -------------------------------------------------------------------------
     # Query operations
@@ -106,31 +145,20 @@ class Tracker:
     
     def get_pending(self, phase: str) -> List[str]:
         """Get docs that need a specific phase (previous phase done, this one not)."""
-        phase_order = ["pdf_created", "mineru_done", "classified", "extracted"]
-        
-        if phase not in phase_order:
+        if phase not in PHASE_ORDER:
             return []
         
-        phase_idx = phase_order.index(phase)
-        prev_phase = phase_order[phase_idx - 1] if phase_idx > 0 else None
-        
-        pending = []
-        for doc_id, doc in self.data["documents"].items():
-            phases = doc.get("phases", {})
-            
-            # Skip funds for phases after pdf_created
-            if phase != "pdf_created" and doc.get("sic") in ("NULL", None):
-                continue
-            
-            # Check if previous phase done (or no previous phase)
-            if prev_phase and prev_phase not in phases:
-                continue
-            
-            # Check if this phase not done
-            if phase not in phases:
-                pending.append(doc_id)
-        
-        return pending
+        docs = self.data["documents"]
+        position = PHASE_ORDER.index(phase)
+        if position == 0:
+            candidates = docs.keys()
+        else:
+            candidates = self._phase_docs.get(PHASE_ORDER[position - 1], set())
+        pending = candidates - self._phase_docs.get(phase, set())
+        # Funds are skipped for phases after pdf_created
+        if position > 0:
+            pending -= self._fund_docs
+        return list(pending)
     
     def get_all_doc_ids(self) -> List[str]:
         """Get all tracked doc_ids."""
@@ -140,20 +168,30 @@ class Tracker:
     # Stats
     # -------------------------------------------------------------------------
     
+    def _build_index(self):
+        """Build phase/status/fund doc_id sets in one pass over the documents."""
+        phase_docs = {phase: set() for phase in PHASE_ORDER}
+        status_docs = {"complete": set(), "no_sct": set(), "fund": set(), "pending": set()}
+        fund_docs = set()
+        
+        for doc_id, doc in self._data["documents"].items():
+            for phase in doc.get("phases", {}):
+                phase_docs.setdefault(phase, set()).add(doc_id)
+            status_docs.setdefault(doc.get("status", "pending"), set()).add(doc_id)
+            if doc.get("sic") in ("NULL", None):
+                fund_docs.add(doc_id)
+        
+        self._phase_docs = phase_docs
+        self._status_docs = status_docs
+        self._fund_docs = fund_docs
+    
     def stats(self) -> dict:
         """Get summary statistics."""
         docs = self.data["documents"]
-        
         status_counts = {"complete": 0, "no_sct": 0, "fund": 0, "pending": 0}
+        status_counts.update((status, len(ids)) for status, ids in self._status_docs.items() if ids)
         phase_counts = {"pdf_created": 0, "mineru_done": 0, "classified": 0, "extracted": 0}
-        
-        for doc in docs.values():
-            status = doc.get("status", "pending")
-            status_counts[status] = status_counts.get(status, 0) + 1
-            
-            for phase in doc.get("phases", {}):
-                phase_counts[phase] = phase_counts.get(phase, 0) + 1
-        
+        phase_counts.update((phase, len(ids)) for phase, ids in self._phase_docs.items() if ids)
         return {
             "total": len(docs),
             "by_status": status_counts,
@@ -187,74 +225,86 @@ class Tracker:
     # Rebuild from files
     # -------------------------------------------------------------------------
     
+    def _rebuild_one(self, folder: Path) -> Optional[tuple]:
+        """Build the tracker entry for one output folder: (doc_id, doc) or None."""
+        doc_id = folder.name
+        
+        # One directory listing instead of an exists() per result file
+        with os.scandir(folder) as entries:
+            names = {e.name for e in entries if e.is_file(follow_symlinks=False)}
+        
+        # Load metadata
+        if "metadata.json" not in names:
+            return None
+        
+        meta = orjson.loads((folder / "metadata.json").read_bytes())
+        
+        # Determine phases
+        phases = {}
+        phases["pdf_created"] = meta.get("created_at", datetime.now().isoformat())
+        
+        # Check MinerU (known layout first, rglob only as fallback)
+        if find_content_list(folder) is not None:
+            phases["mineru_done"] = datetime.now().isoformat()
+        
+        # Check classification
+        has_class = "classification_results.json" in names
+        if has_class:
+            phases["classified"] = datetime.now().isoformat()
+        
+        # Check extraction
+        has_extract = "extraction_results.json" in names
+        has_no_sct = "no_sct_found.json" in names
+        
+        if has_extract or has_no_sct:
+            phases["extracted"] = datetime.now().isoformat()
+        
+        # Determine status
+        sic = meta.get("sic")
+        if sic in ("NULL", None):
+            status = "fund"
+        elif has_extract:
+            status = "complete"
+        elif has_no_sct:
+            status = "no_sct"
+        else:
+            status = "pending"
+        
+        # Get SCT tables
+        sct_tables = []
+        if has_class:
+            class_data = orjson.loads((folder / "classification_results.json").read_bytes())
+            sct_tables = [t.get("image_path", "") for t in class_data.get("tables", [])]
+        
+        return doc_id, {
+            "cik": meta.get("cik"),
+            "company_name": meta.get("company_name"),
+            "year": meta.get("year"),
+            "accession_number": meta.get("accession_number"),
+            "sic": sic,
+            "phases": phases,
+            "status": status,
+            "sct_tables": sct_tables
+        }
+    
     def rebuild_from_files(self):
         """Rebuild tracker by scanning existing output folders."""
         print("Rebuilding tracker from files...")
         
         self._data = {"last_updated": None, "documents": {}}
         
-        folders = [d for d in self.output_path.iterdir() if d.is_dir()]
+        with os.scandir(self.output_path) as entries:
+            folders = [Path(e.path) for e in entries if e.is_dir()]
+        
+        # Folders are independent and the work is file I/O: scan them in threads
+        with ThreadPoolExecutor(max_workers=REBUILD_WORKERS) as executor:
+            results = list(executor.map(self._rebuild_one, folders))
         
-        for folder in folders:
-            doc_id = folder.name
-            
-            # Load metadata
-            meta_path = folder / "metadata.json"
-            if not meta_path.exists():
-                continue
-            
-            with open(meta_path) as f:
-                meta = json.load(f)
-            
-            # Determine phases
-            phases = {}
-            phases["pdf_created"] = meta.get("created_at", datetime.now().isoformat())
-            
-            # Check MinerU
-            if list(folder.rglob("*_content_list.json")):
-                phases["mineru_done"] = datetime.now().isoformat()
-            
-            # Check classification
-            class_path = folder / "classification_results.json"
-            if class_path.exists():
-                phases["classified"] = datetime.now().isoformat()
-            
-            # Check extraction
-            extract_path = folder / "extraction_results.json"
-            no_sct_path = folder / "no_sct_found.json"
-            
-            if extract_path.exists() or no_sct_path.exists():
-                phases["extracted"] = datetime.now().isoformat()
-            
-            # Determine status
-            sic = meta.get("sic")
-            if sic in ("NULL", None):
-                status = "fund"
-            elif extract_path.exists():
-                status = "complete"
-            elif no_sct_path.exists():
-                status = "no_sct"
-            else:
-                status = "pending"
-            
-            # Get SCT tables
-            sct_tables = []
-            if class_path.exists():
-                with open(class_path) as f:
-                    class_data = json.load(f)
-                sct_tables = [t.get("image_path", "") for t in class_data.get("tables", [])]
-            
-            # Add to tracker
-            self._data["documents"][doc_id] = {
-                "cik": meta.get("cik"),
-                "company_name": meta.get("company_name"),
-                "year": meta.get("year"),
-                "accession_number": meta.get("accession_number"),
-                "sic": sic,
-                "phases": phases,
-                "status": status,
-                "sct_tables": sct_tables
-            }
+        for result in results:
+            if result is not None:
+                doc_id, doc = result
+                self._data["documents"][doc_id] = doc
         
+        self._build_index()
         self.save()
         print(f"✓ Rebuilt tracker with {len(self._data['documents'])} documents")
@@ -3,6 +3,7 @@
 from .schemas import (
     TableType,
     TableClassification,
+    ClassificationRow,
     Executive,
     SummaryCompensationTable
 )
@@ -17,3 +18,4 @@ from .extraction import (
     extract_all_summary_compensation
 )
 from .classifier import SCTClassifier
+from .client import build_vlm_client
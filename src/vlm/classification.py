@@ -1,13 +1,16 @@
 import asyncio
-import base64
 from pathlib import Path
 from typing import Optional
 from openai import AsyncOpenAI
 import json
 import textwrap
+import orjson
 
-from .prompts import CLASSIFICATION_PROMPT
-from .schemas import TableType, TableClassification
+from .prompts import CLASSIFICATION_PROMPT_PARTS, PROMPT_VERSION
+from .schemas import TableType, TableClassification, ClassificationRow
+from .retry import with_retry
+from ..io.cache import make_cache_key, get_or_compute_async
+from ..io.images import load_image_url_async
 
 # ============== CONFIGURATION ==============
 CLASSIFY_MAX_TOKENS = 2000
@@ -15,15 +18,20 @@ CLASSIFY_TEMPERATURE = 0.0
 TABLE_BODY_TRUNCATE = 2000  # Max chars to send for classification
 CLASSIFY_MAX_CONCURRENT = 8  # Max concurrent classification requests
 
+# Computed once: schema generation walks the whole model
+_CLASSIFICATION_SCHEMA = TableClassification.model_json_schema()
+# Everything besides the prompt that shapes the cached response
+_CLASSIFY_CACHE_PARAMS = (orjson.dumps(_CLASSIFICATION_SCHEMA, option=orjson.OPT_SORT_KEYS),
+                          CLASSIFY_MAX_TOKENS, CLASSIFY_TEMPERATURE)
 
-def load_image_b64(img_path: Path) -> Optional[str]:
-    """Load image as base64 string."""
-    if img_path.exists():
-        with open(img_path, 'rb') as f:
-            return base64.b64encode(f.read()).decode()
-    return None
+
+def build_classification_prompt(caption: str, footnotes: str, table_body: str) -> str:
+    """Same text as CLASSIFICATION_PROMPT.format(...), by joining the pre-split parts."""
+    before_caption, before_footnotes, before_body, after_body = CLASSIFICATION_PROMPT_PARTS
+    return "".join((before_caption, caption, before_footnotes, footnotes, before_body, table_body, after_body))
 
 
+@with_retry
 async def classify_table(table: dict, images_base_dir: Path, client: AsyncOpenAI, model: str) -> TableClassification:
     """Classify a single table using VLM with image."""
     
@@ -31,35 +39,35 @@ async def classify_table(table: dict, images_base_dir: Path, client: AsyncOpenAI
     footnotes = ' '.join(table.get('table_footnote', []))
     body = table.get('table_body', '')[:TABLE_BODY_TRUNCATE]
     
-    prompt = CLASSIFICATION_PROMPT.format(
-        caption=caption,
-        footnotes=footnotes,
-        table_body=body
-    )
+    prompt = build_classification_prompt(caption, footnotes, body)
     
     content = [{"type": "text", "text": prompt}]
+    img_key = None
     
     # Solo se img_path esiste e non è vuoto
     img_path_str = table.get('img_path', '')
     if img_path_str:
-        img_path = images_base_dir / img_path_str
-        if img_path.exists() and img_path.is_file():
-            img_b64 = load_image_b64(img_path)
-            if img_b64:
-                content.append({
-                    "type": "image_url", 
-                    "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
-                })
-    
-    r = await client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": content}],
-        max_tokens=CLASSIFY_MAX_TOKENS,
-        temperature=CLASSIFY_TEMPERATURE,
-        extra_body={"guided_json": TableClassification.model_json_schema()}
-    )
-    
-    return TableClassification.model_validate_json(r.choices[0].message.content)
+        # Disk read in a thread: overlaps with the other in-flight requests
+        img_url, img_key = await load_image_url_async(images_base_dir / img_path_str)
+        if img_url:
+            content.append({
+                "type": "image_url", 
+                "image_url": {"url": img_url}
+            })
+    
+    async def request() -> str:
+        r = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": content}],
+            max_tokens=CLASSIFY_MAX_TOKENS,
+            temperature=CLASSIFY_TEMPERATURE,
+            extra_body={"guided_json": _CLASSIFICATION_SCHEMA}
+        )
+        # Validate before caching so malformed responses are never stored
+        return TableClassification.model_validate_json(r.choices[0].message.content).model_dump_json()
+    
+    key = make_cache_key("classify", PROMPT_VERSION, model, prompt, img_key, *_CLASSIFY_CACHE_PARAMS)
+    return await get_or_compute_async(key, request, parse=TableClassification.model_validate_json)
 
 
 def load_doc_metadata(doc_source: str, base_path: Path) -> Optional[dict]:
@@ -80,20 +88,30 @@ async def find_summary_compensation_in_doc(
     display_func=None,
     plt_module=None,
     pil_image_class=None,
-    debug: bool = False
+    debug: bool = False,
+    tables_by_doc: Optional[dict] = None
 ):
     """
     Cerca summary compensation tables in un singolo documento.
     
+    tables_by_doc: output opzionale di group_tables_by_doc(all_tables), evita
+    di riscandire all_tables per ogni documento.
+    
     Returns:
-        Tuple of (found, all_classifications) where:
+        Tuple of (found, all_classifications, failed) where:
         - found: list of summary_compensation tables
-        - all_classifications: dict mapping (page_idx, bbox) -> classification for ALL tables
+        - all_classifications: dict mapping (page_idx, bbox) -> ClassificationRow for ALL tables
+        - failed: list of (table index, exception) for tables that still failed
+          after retries. Non-empty means found may be incomplete: the document
+          must not be marked as done.
     """
     from tqdm.auto import tqdm
     
     # Filtra tabelle di questo documento
-    doc_tables = [t for t in all_tables if t.get('source_doc') == doc_source]
+    if tables_by_doc is not None:
+        doc_tables = tables_by_doc.get(doc_source, [])
+    else:
+        doc_tables = [t for t in all_tables if t.get('source_doc') == doc_source]
     if debug:
         print(f"Document: {doc_source}")
         print(f"Tables in document: {len(doc_tables)}")
@@ -110,6 +128,7 @@ async def find_summary_compensation_in_doc(
             print("Metadata not found\n")
     
     found = []
+    failed = []  # (index, error) for tables that failed after retries
     all_classifications = {}  # Store ALL classifications
     
     # MinerU crea output/doc_source/doc_source/vlm/
@@ -137,13 +156,14 @@ async def find_summary_compensation_in_doc(
         i, t, result, error = await coro
         
         if error:
+            failed.append((i, error))
             if debug:
                 print(f"Error on table {i}: {error}")
             continue
         
         # Store classification for ALL tables (not just summary_compensation)
         key = (t.get('page_idx'), tuple(t.get('bbox', [])))
-        all_classifications[key] = result.model_dump()
+        all_classifications[key] = ClassificationRow.from_result(key[0], key[1], result)
         
         if debug:
             print(f"--- Table {i} (page {t.get('page_idx')}) ---")
@@ -176,4 +196,6 @@ async def find_summary_compensation_in_doc(
             print()
     
     print(f"Found {len(found)} Summary Compensation Tables")
-    return found, all_classifications
+    if failed:
+        print(f"⚠️  {len(failed)} tables failed classification after retries")
+    return found, all_classifications, failed
@@ -10,11 +10,18 @@ Usage:
     classifier = SCTClassifier()
     prob = classifier.classify(image)  # Single image
     probs = classifier.classify_batch(images)  # Batch
+    prob = await classifier.classify_async(image)  # Concurrent calls share a batch
 """
 
+import asyncio
+import os
+from contextlib import contextmanager
+from functools import lru_cache, partial
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torchvision.io import ImageReadMode, decode_jpeg, read_file
 from pathlib import Path
 from typing import Union, List, Optional
 from PIL import Image
@@ -24,6 +31,78 @@ from tqdm.auto import tqdm
 _processor = None
 _model = None
 
+# ============== CONFIGURATION ==============
+# classify_async() coalesces concurrent calls into one forward pass
+MICRO_BATCH_MAX_SIZE = 8
+MICRO_BATCH_MAX_LATENCY_MS = 10  # Max wait for more requests once one is queued
+# torch.compile the model after loading (opt-in: first calls pay the compile time)
+TORCH_COMPILE = False
+TORCH_COMPILE_MODE = "max-autotune"
+# Load the VLM backbone with int8 weights (bitsandbytes, not in requirements):
+# ~half the VRAM and weight bandwidth; the classification head stays full precision
+LOAD_IN_8BIT = False
+# classify_batch preprocessing (image decode + processor) in DataLoader workers,
+# overlapped with the GPU forward of the previous batch. 0 = in the main process.
+# Workers are started per classify_batch call, so only worth it for one large call
+# (post_processing passes its own value); under spawn/forkserver each worker
+# also unpickles the processor once
+PREPROCESS_WORKERS = 0
+PREFETCH_FACTOR = 2
+# Torch-based image processor: resize + rescale + normalize + patchify as fused
+# tensor ops instead of per-step NumPy passes over each table crop
+USE_FAST_PROCESSOR = True
+JPEG_SUFFIXES = (".jpg", ".jpeg")
+CLASSIFY_PROMPT = "Classify this table."
+DECODED_IMAGE_CACHE_SIZE = 64  # Decoded images kept for paths classified again (e.g. classify then is_sct)
+
+
+def load_image(path: Union[str, Path]) -> Union[torch.Tensor, Image.Image]:
+    """
+    Decode a table image from disk.
+    
+    JPEGs (all MinerU crops) go through torchvision's libjpeg-turbo decoder and
+    come back as a uint8 CHW tensor, which the processor takes as-is; other
+    formats, or JPEGs torchvision can't decode, fall back to PIL RGB.
+    """
+    if str(path).lower().endswith(JPEG_SUFFIXES):
+        try:
+            return decode_jpeg(read_file(str(path)), mode=ImageReadMode.RGB)
+        except RuntimeError:
+            pass
+    return Image.open(path).convert("RGB")
+
+
+@lru_cache(maxsize=DECODED_IMAGE_CACHE_SIZE)
+def _load_image_cached(path: str, mtime_ns: int) -> Union[torch.Tensor, Image.Image]:
+    # mtime_ns is part of the key only: a rewritten file (merged tables) is decoded again
+    return load_image(path)
+
+
+def load_image_cached(path: Union[str, Path]) -> Union[torch.Tensor, Image.Image]:
+    """load_image() with a small LRU keyed by (path, mtime)."""
+    path = str(path)
+    return _load_image_cached(path, os.stat(path).st_mtime_ns)
+
+
+def _collate(processor, prompt_text: str, images: List[Union[str, Path, Image.Image]],
+             load=load_image) -> dict:
+    """
+    Load images and run the processor (CPU side of a batch).
+    
+    Module-level so DataLoader workers receive only (processor, prompt) through
+    functools.partial, not the SCTClassifier with its model and CUDA state.
+    Workers use plain load_image: an LRU filled in a short-lived worker is never hit.
+    """
+    batch_images = []
+    for img in images:
+        if isinstance(img, (str, Path)):
+            img = load(img)
+        batch_images.append(img)
+    
+    texts = [prompt_text] * len(batch_images)
+    inputs = processor(text=texts, images=batch_images, padding=True, return_tensors="pt")
+    return dict(inputs)
+
 
 class VLMClassifier(nn.Module):
     """VLM with classification head."""
@@ -56,8 +135,13 @@ class VLMClassifier(nn.Module):
             return_dict=True
         )
         hidden_states = outputs.hidden_states[-1]
-        pooled = hidden_states.mean(dim=1)
-        logits = self.classifier(pooled.float())
+        # Mean over real tokens only, so padding in a batch doesn't shift an image's score.
+        # Sum and token count in fp32: bf16 can't hold counts above 256 exactly
+        # (1500 -> 1504), which would rescale every pooled vector
+        mask = attention_mask.unsqueeze(-1)
+        summed = (hidden_states * mask.to(hidden_states.dtype)).sum(dim=1, dtype=torch.float32)
+        count = attention_mask.sum(dim=1, keepdim=True, dtype=torch.float32).clamp(min=1)
+        logits = self.classifier(summed / count)
         return logits
 
 
@@ -70,6 +154,8 @@ class SCTClassifier:
                    If local path doesn't exist, downloads from HuggingFace.
         device: Device to run on ('cuda' or 'cpu')
         threshold: Probability threshold for is_sct classification
+        compile_model: torch.compile the model (fewer kernel launches at small batch sizes)
+        load_in_8bit: Quantize the backbone to int8 on load (requires bitsandbytes)
     """
     
     DEFAULT_LOCAL_PATH = Path(__file__).parent.parent.parent / "hf/models/exp2-weighted-loss-qwen3/full"
@@ -79,12 +165,24 @@ class SCTClassifier:
         self, 
         model_path: Union[str, Path] = None,
         device: str = "cuda",
-        threshold: float = 0.5
+        threshold: float = 0.5,
+        compile_model: bool = TORCH_COMPILE,
+        load_in_8bit: bool = LOAD_IN_8BIT
     ):
         self.device = device
         self.threshold = threshold
+        self.compile_model = compile_model
+        self.load_in_8bit = load_in_8bit
         self._model = None
         self._processor = None
+        self._prompt_text = None
+        # Reusable device buffers for batch inputs and their copy stream (see _stage)
+        self._device_buffers = {}
+        self._copy_stream = None
+        # classify_async() micro-batcher, bound to the event loop that started it
+        self._batch_queue = None
+        self._batch_worker = None
+        self._batch_loop = None
         
         # Resolve model path
         if model_path is None:
@@ -138,11 +236,30 @@ class SCTClassifier:
             config = json.load(f)
         
         # Load processor and base model
-        self._processor = AutoProcessor.from_pretrained(str(model_path))
+        self._processor = AutoProcessor.from_pretrained(str(model_path), use_fast=USE_FAST_PROCESSOR)
+        # Same prompt for every image: render the chat template once. The image
+        # placeholder is expanded by the processor from each image's grid.
+        self._prompt_text = self._processor.apply_chat_template(
+            [{
+                "role": "user",
+                "content": [
+                    {"type": "image"},
+                    {"type": "text", "text": CLASSIFY_PROMPT}
+                ]
+            }],
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        quantization_config = None
+        if self.load_in_8bit:
+            from transformers import BitsAndBytesConfig
+            quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+        
         base_model = AutoModelForVision2Seq.from_pretrained(
             str(model_path),
             torch_dtype=torch.bfloat16,
-            device_map=self.device
+            device_map=self.device,
+            quantization_config=quantization_config
         )
         
         # Create classifier and load head weights
@@ -150,26 +267,37 @@ class SCTClassifier:
             base_model, 
             hidden_size=config["hidden_size"],
             num_labels=config["num_labels"]
-        ).to(self.device)
+        )
+        if self.load_in_8bit:
+            # Quantized weights are already placed by device_map and can't be moved
+            self._model.classifier.to(self.device)
+        else:
+            self._model.to(self.device)
         
         head_path = model_path / "classifier_head.safetensors"
         self._model.classifier.load_state_dict(load_file(head_path))
         self._model.eval()
+        self._model.requires_grad_(False)
+        
+        if self.compile_model:
+            # Image grids vary per table, so shapes are dynamic: marking them
+            # avoids a recompile for every new image size
+            self._model = torch.compile(self._model, mode=TORCH_COMPILE_MODE, dynamic=True)
         
         print(f"✓ SCT Classifier loaded (threshold={self.threshold})")
     
-    def _prepare_input(self, image: Image.Image) -> dict:
+    @contextmanager
+    def _inference(self):
+        """Inference mode (no autograd bookkeeping) with bf16 autocast on CUDA."""
+        device_type = torch.device(self.device).type
+        with torch.inference_mode(), torch.autocast(
+            device_type=device_type, dtype=torch.bfloat16, enabled=device_type == "cuda"
+        ):
+            yield
+    
+    def _prepare_input(self, image: Union[torch.Tensor, Image.Image]) -> dict:
         """Prepare single image for classification."""
-        messages = [[{
-            "role": "user",
-            "content": [
-                {"type": "image", "image": image},
-                {"type": "text", "text": "Classify this table."}
-            ]
-        }]]
-        
-        texts = [self._processor.apply_chat_template(m, tokenize=False, add_generation_prompt=True) for m in messages]
-        inputs = self._processor(text=texts, images=[image], padding=True, return_tensors="pt")
+        inputs = self._processor(text=[self._prompt_text], images=[image], padding=True, return_tensors="pt")
         return inputs
     
     def classify(self, image: Union[str, Path, Image.Image]) -> float:
@@ -186,13 +314,13 @@ class SCTClassifier:
         
         # Load image if path
         if isinstance(image, (str, Path)):
-            image = Image.open(image).convert("RGB")
+            image = load_image_cached(image)
         elif not isinstance(image, Image.Image):
             raise ValueError(f"Expected PIL Image or path, got {type(image)}")
         
         inputs = self._prepare_input(image)
         
-        with torch.no_grad():
+        with self._inference():
             input_ids = inputs["input_ids"].to(self.device)
             attention_mask = inputs["attention_mask"].to(self.device)
             pixel_values = inputs["pixel_values"].to(self.device, dtype=torch.bfloat16)
@@ -207,7 +335,8 @@ class SCTClassifier:
         self, 
         images: List[Union[str, Path, Image.Image]],
         batch_size: int = 4,
-        show_progress: bool = True
+        show_progress: bool = True,
+        num_workers: int = PREPROCESS_WORKERS
     ) -> List[float]:
         """
         Classify multiple images.
@@ -216,51 +345,226 @@ class SCTClassifier:
             images: List of PIL Images or paths
             batch_size: Batch size for processing
             show_progress: Show progress bar
+            num_workers: DataLoader workers preparing the next batches (0 = main process)
             
         Returns:
             List of probabilities (0-1)
         """
         self._load_model()
         
+        from torch.utils.data import DataLoader
+        
+        n_batches = (len(images) + batch_size - 1) // batch_size
+        # Workers only pay off when there is a next batch to prepare
+        num_workers = num_workers if n_batches > 1 else 0
+        loader = DataLoader(
+            images,
+            batch_size=batch_size,
+            # The decoded-image LRU only helps when collate runs in this process
+            collate_fn=partial(_collate, self._processor, self._prompt_text,
+                               load=load_image if num_workers else load_image_cached),
+            num_workers=num_workers,
+            prefetch_factor=PREFETCH_FACTOR if num_workers else None,
+            pin_memory=torch.device(self.device).type == "cuda"
+        )
+        
         results = []
-        iterator = range(0, len(images), batch_size)
+        iterator = loader
         if show_progress:
-            iterator = tqdm(iterator, desc="Classifying", total=(len(images) + batch_size - 1) // batch_size)
+            iterator = tqdm(iterator, desc="Classifying", total=n_batches)
         
-        for i in iterator:
-            batch_images = []
-            for img in images[i:i + batch_size]:
-                if isinstance(img, (str, Path)):
-                    img = Image.open(img).convert("RGB")
-                batch_images.append(img)
-            
-            # Process batch
-            messages_batch = []
-            for img in batch_images:
-                messages_batch.append([{
-                    "role": "user",
-                    "content": [
-                        {"type": "image", "image": img},
-                        {"type": "text", "text": "Classify this table."}
-                    ]
-                }])
-            
-            texts = [self._processor.apply_chat_template(m, tokenize=False, add_generation_prompt=True) for m in messages_batch]
-            inputs = self._processor(text=texts, images=batch_images, padding=True, return_tensors="pt")
-            
-            with torch.no_grad():
-                input_ids = inputs["input_ids"].to(self.device)
-                attention_mask = inputs["attention_mask"].to(self.device)
-                pixel_values = inputs["pixel_values"].to(self.device, dtype=torch.bfloat16)
-                image_grid_thw = inputs["image_grid_thw"].to(self.device)
-                
-                logits = self._model(input_ids, attention_mask, pixel_values, image_grid_thw)
-                probs = F.softmax(logits, dim=-1)
-            
-            results.extend(probs[:, 1].cpu().tolist())
+        # Software pipeline: batch n is copied (copy stream, staging slot n % 2)
+        # and queued while batch n-1 still runs; only then are n-1's results read
+        pending = None
+        with self._inference():
+            for n, inputs in enumerate(iterator):
+                probs = self._launch(self._stage_inputs(inputs, slot=n % 2))
+                if pending is not None:
+                    results.extend(self._collect(*pending))
+                pending = self._readback(probs)
+        if pending is not None:
+            results.extend(self._collect(*pending))
         
+        # Staging buffers are kept for the next call: release_buffers() at the end of a run
         return results
     
+    def _classify_chunk(self, images: List[Union[str, Path, Image.Image]]) -> List[float]:
+        """Run one padded forward pass over a list of images."""
+        return self._forward(self._build_inputs(images))
+    
+    def _build_inputs(self, images: List[Union[str, Path, Image.Image]]) -> dict:
+        """Load images and run the processor (in this process: decoded images are cached)."""
+        return _collate(self._processor, self._prompt_text, images, load=load_image_cached)
+    
+    def _forward(self, inputs: dict) -> List[float]:
+        """Move a processed batch to the device and return P(SCT) per image."""
+        with self._inference():
+            # Own staging slot: runs in a worker thread (classify_async), possibly
+            # while classify_batch is using slots 0/1
+            probs = self._launch(self._stage_inputs(inputs, slot="async"))
+            return self._collect(*self._readback(probs))
+    
+    def _stage_inputs(self, inputs: dict, slot: Union[int, str] = 0) -> tuple:
+        """Issue the host-to-device copies of a batch (on the copy stream on CUDA)."""
+        if torch.device(self.device).type != "cuda":
+            return (
+                inputs["input_ids"].to(self.device),
+                inputs["attention_mask"].to(self.device),
+                inputs["pixel_values"].to(self.device, dtype=torch.bfloat16),
+                inputs["image_grid_thw"].to(self.device)
+            )
+        
+        if self._copy_stream is None:
+            self._copy_stream = torch.cuda.Stream(device=self.device)
+        return (
+            self._stage(f"input_ids/{slot}", inputs["input_ids"]),
+            self._stage(f"attention_mask/{slot}", inputs["attention_mask"]),
+            self._stage(f"pixel_values/{slot}", inputs["pixel_values"], dtype=torch.bfloat16),
+            self._stage(f"image_grid_thw/{slot}", inputs["image_grid_thw"])
+        )
+    
+    def _launch(self, device_inputs: tuple) -> torch.Tensor:
+        """Queue the forward pass (after the batch's copies) and return P(SCT) on the device."""
+        if self._copy_stream is not None:
+            torch.cuda.current_stream().wait_stream(self._copy_stream)
+        logits = self._model(*device_inputs)
+        return F.softmax(logits, dim=-1)[:, 1]
+    
+    def _readback(self, probs: torch.Tensor) -> tuple:
+        """Start the device-to-host copy of probs: (host tensor, event to wait on or None)."""
+        if torch.device(self.device).type != "cuda":
+            return probs, None
+        host = torch.empty(probs.shape, dtype=probs.dtype, pin_memory=True)
+        host.copy_(probs, non_blocking=True)
+        event = torch.cuda.Event()
+        event.record()
+        return host, event
+    
+    def _collect(self, host: torch.Tensor, event) -> List[float]:
+        """Wait for a _readback copy (not for later queued work) and return the values."""
+        if event is not None:
+            event.synchronize()
+        return host.float().tolist()
+    
+    def _stage(self, name: str, tensor: torch.Tensor, dtype: torch.dtype = None) -> torch.Tensor:
+        """
+        Copy a batch tensor into its CUDA staging buffer on the copy stream.
+        
+        Each input has a buffer per pipeline slot that only grows, so batches
+        of varying shape reuse one allocation instead of churning the allocator.
+        A slot is rewritten two batches later, after its results were collected.
+        """
+        dtype = dtype or tensor.dtype
+        numel = tensor.numel()
+        buf = self._device_buffers.get(name)
+        if buf is None or buf.dtype != dtype or buf.numel() < numel:
+            # Allocated on the compute stream, which is where the buffer is read
+            buf = torch.empty(numel, dtype=dtype, device=self.device)
+            self._device_buffers[name] = buf
+            self._copy_stream.wait_stream(torch.cuda.current_stream())
+        staged = buf[:numel].view(tensor.shape)
+        with torch.cuda.stream(self._copy_stream):
+            # non_blocking: copies from pinned memory overlap with the running forward
+            staged.copy_(tensor, non_blocking=True)
+        return staged
+    
+    def release_buffers(self):
+        """
+        Free the staging buffers and return cached blocks to the driver.
+        
+        Call once at the end of a run (not between classify_batch calls, which
+        reuse the buffers), and not while a classification is in flight.
+        """
+        self._device_buffers.clear()
+        if torch.device(self.device).type == "cuda":
+            torch.cuda.empty_cache()
+    
+    async def classify_async(self, image: Union[str, Path, Image.Image]) -> float:
+        """
+        Classify a single image, batching it with concurrent classify_async() calls.
+        
+        Requests queued within MICRO_BATCH_MAX_LATENCY_MS of each other share one
+        forward pass of up to MICRO_BATCH_MAX_SIZE images.
+        
+        Returns:
+            Probability that the image is a Summary Compensation Table (0-1)
+        """
+        loop = asyncio.get_running_loop()
+        if self._batch_loop is not loop or self._batch_worker.done():
+            if self._batch_loop is not loop:
+                self._cancel_batch_worker()
+            self._batch_queue = asyncio.Queue()
+            self._batch_worker = loop.create_task(self._batch_worker_loop(self._batch_queue))
+            self._batch_loop = loop
+        
+        future = loop.create_future()
+        await self._batch_queue.put((image, future))
+        return await future
+    
+    async def _batch_worker_loop(self, queue: asyncio.Queue):
+        """Drain the queue into micro-batches and resolve each request's future."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            try:
+                deadline = loop.time() + MICRO_BATCH_MAX_LATENCY_MS / 1000
+                while len(batch) < MICRO_BATCH_MAX_SIZE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                
+                images = [image for image, _ in batch]
+                # Model load + forward off the event loop
+                await asyncio.to_thread(self._load_model)
+                probs = await asyncio.to_thread(self._classify_chunk, images)
+            except asyncio.CancelledError:
+                # aclose() / loop change: don't leave callers awaiting forever
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), prob in zip(batch, probs):
+                if not future.done():
+                    future.set_result(prob)
+    
+    def _cancel_batch_worker(self):
+        """Cancel the micro-batch worker and fail the requests still queued for it."""
+        worker, queue = self._batch_worker, self._batch_queue
+        self._batch_worker = self._batch_queue = self._batch_loop = None
+        if worker is None or worker.done():
+            return
+        try:
+            worker.cancel()
+        except RuntimeError:
+            return  # Its event loop is already closed: nothing left to run
+        while not queue.empty():
+            _, future = queue.get_nowait()
+            if not future.done():
+                future.cancel()
+    
+    async def aclose(self):
+        """Stop the classify_async() worker (call before the event loop shuts down)."""
+        worker = self._batch_worker
+        self._cancel_batch_worker()
+        if worker is not None:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+    
     def is_sct(self, image: Union[str, Path, Image.Image]) -> bool:
         """Check if image is SCT using threshold."""
         return self.classify(image) >= self.threshold
+    
+    def clear_cache(self):
+        """Drop decoded images kept by load_image_cached (long-running processes)."""
+        _load_image_cached.cache_clear()
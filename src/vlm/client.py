@@ -0,0 +1,35 @@
+# Shared AsyncOpenAI client for the VLM server
+
+import httpx
+from openai import AsyncOpenAI
+
+# ============== CONFIGURATION ==============
+VLM_TIMEOUT = 600.0  # Seconds per request (long extractions)
+VLM_CONNECT_TIMEOUT = 10.0
+# Peak in-flight requests = concurrent docs x per-doc classification semaphore
+VLM_MAX_CONNECTIONS = 128
+# HTTP/2 needs the optional `h2` package and an https endpoint (vLLM serves plain http)
+VLM_HTTP2 = False
+
+
+def build_vlm_client(base_url: str, api_key: str = "dummy",
+                     max_connections: int = VLM_MAX_CONNECTIONS) -> AsyncOpenAI:
+    """
+    Build the AsyncOpenAI client used for classification and extraction.
+
+    Create one per process and reuse it: every keep-alive connection stays in
+    the pool, so requests skip the TCP (and TLS) handshake.
+
+    Args:
+        base_url: OpenAI-compatible endpoint (e.g. "http://localhost:8000/v1")
+        api_key: API key (vLLM ignores it)
+        max_connections: Pool size, should cover the peak number of in-flight requests
+    """
+    http_client = httpx.AsyncClient(
+        http2=VLM_HTTP2,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(VLM_TIMEOUT, connect=VLM_CONNECT_TIMEOUT)
+    )
+    # Retries are done by with_retry (retry.py) around each request: SDK retries
+    # on top would multiply the attempts (and timeouts) per table
+    return AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http_client, max_retries=0)
@@ -1,28 +1,44 @@
 # Estrazione strutturata di dati da tabelle Summary Compensation
 
 import asyncio
-import base64
 from pathlib import Path
 from typing import Optional, List
 from openai import AsyncOpenAI
+import orjson
 
-from .prompts import EXTRACTION_PROMPT, EXTRACTION_PROMPT_WITH_IMAGE
+from .prompts import (
+    EXTRACTION_PROMPT_HEADER,
+    EXTRACTION_BODY_PARTS,
+    EXTRACTION_WITH_IMAGE_BODY_PARTS,
+    PROMPT_VERSION
+)
 from .schemas import Executive, SummaryCompensationTable
+from .retry import with_retry
+from ..io.cache import make_cache_key, get_or_compute_async
+from ..io.images import load_image_url_async
 
 # ============== CONFIGURATION ==============
 EXTRACT_MAX_TOKENS = 8000
 EXTRACT_TEMPERATURE = 0.0
 EXTRACT_MAX_CONCURRENT = 4  # Max concurrent extraction requests
 
+# Computed once: schema generation walks the whole model
+_EXTRACTION_SCHEMA = SummaryCompensationTable.model_json_schema()
+# Everything besides the prompt that shapes the cached response
+_EXTRACT_CACHE_PARAMS = (orjson.dumps(_EXTRACTION_SCHEMA, option=orjson.OPT_SORT_KEYS),
+                         EXTRACT_MAX_TOKENS, EXTRACT_TEMPERATURE)
 
-def load_image_b64(img_path: Path) -> Optional[str]:
-    """Load image as base64 string."""
-    if img_path.exists():
-        with open(img_path, 'rb') as f:
-            return base64.b64encode(f.read()).decode()
-    return None
+
+def build_extraction_header(company: str = "", cik: str = "", filing_year: str = "") -> str:
+    """Render the per-document part of the extraction prompt."""
+    return EXTRACTION_PROMPT_HEADER.format(
+        company=company or "Unknown",
+        cik=cik or "Unknown",
+        filing_year=filing_year or "Unknown"
+    )
 
 
+@with_retry
 async def extract_summary_compensation_table(
     table: dict,
     images_base_dir: Path,
@@ -32,47 +48,52 @@ async def extract_summary_compensation_table(
     cik: str = "",
     filing_year: str = "",
     fiscal_year_end: str = "",
-    is_merged: bool = False
+    is_merged: bool = False,
+    prompt_header: Optional[str] = None
 ) -> SummaryCompensationTable:
-    """Estrae dati strutturati da una Summary Compensation Table."""
+    """
+    Estrae dati strutturati da una Summary Compensation Table.
+    
+    prompt_header: pre-rendered build_extraction_header() output; rendered
+    from company/cik/filing_year when not given.
+    """
     
-    caption = table.get('table_caption', [''])[0] if table.get('table_caption') else ''
     table_body = table.get('table_body', '')  # Full HTML, no truncation
     
+    if prompt_header is None:
+        prompt_header = build_extraction_header(company, cik, filing_year)
+    
     # Use different prompt for merged tables (with image)
-    prompt_template = EXTRACTION_PROMPT_WITH_IMAGE if is_merged else EXTRACTION_PROMPT
-    prompt = prompt_template.format(
-        company=company or "Unknown",
-        cik=cik or "Unknown",
-        filing_year=filing_year or "Unknown",
-        fiscal_year_end=fiscal_year_end or "Unknown",
-        table_body=table_body
-    )
+    body_before, body_after = EXTRACTION_WITH_IMAGE_BODY_PARTS if is_merged else EXTRACTION_BODY_PARTS
+    prompt = prompt_header + body_before + table_body + body_after
     
     content = [{"type": "text", "text": prompt}]
+    img_key = None
     
     # Add image for merged tables (HTML may be incomplete)
     if is_merged:
         img_path_str = table.get('img_path', '')
         if img_path_str:
-            img_path = images_base_dir / img_path_str
-            if img_path.exists() and img_path.is_file():
-                img_b64 = load_image_b64(img_path)
-                if img_b64:
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
-                    })
-    
-    response = await client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": content}],
-        max_tokens=EXTRACT_MAX_TOKENS,
-        temperature=EXTRACT_TEMPERATURE,
-        extra_body={"guided_json": SummaryCompensationTable.model_json_schema()}
-    )
+            img_url, img_key = await load_image_url_async(images_base_dir / img_path_str)
+            if img_url:
+                content.append({
+                    "type": "image_url",
+                    "image_url": {"url": img_url}
+                })
+    
+    async def request() -> str:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": content}],
+            max_tokens=EXTRACT_MAX_TOKENS,
+            temperature=EXTRACT_TEMPERATURE,
+            extra_body={"guided_json": _EXTRACTION_SCHEMA}
+        )
+        # Validate before caching so malformed responses are never stored
+        return SummaryCompensationTable.model_validate_json(response.choices[0].message.content).model_dump_json()
     
-    return SummaryCompensationTable.model_validate_json(response.choices[0].message.content)
+    key = make_cache_key("extract", PROMPT_VERSION, model, prompt, img_key, *_EXTRACT_CACHE_PARAMS)
+    return await get_or_compute_async(key, request, parse=SummaryCompensationTable.model_validate_json)
 
 
 
@@ -97,7 +118,9 @@ async def extract_all_summary_compensation(
         metadata: Metadata del documento (company, cik, etc.)
     
     Returns:
-        Lista di SummaryCompensationTable estratte
+        Lista allineata a found_tables: SummaryCompensationTable estratta, o None
+        per le tabelle fallite dopo i retry (placeholder posizionale, così
+        data[i] resta la tabella i di classification_results.json)
     """
     
     company = metadata.get('company', '') if metadata else ''
@@ -105,6 +128,9 @@ async def extract_all_summary_compensation(
     filing_year = str(metadata.get('year', '')) if metadata else ''
     fiscal_year_end = metadata.get('fiscal_year_end', '') if metadata else ''
     
+    # Same header for every table of the document
+    prompt_header = build_extraction_header(company, cik, filing_year)
+    
     # Semaphore to limit concurrent requests
     semaphore = asyncio.Semaphore(EXTRACT_MAX_CONCURRENT)
     
@@ -125,7 +151,8 @@ async def extract_all_summary_compensation(
                     cik=cik,
                     filing_year=filing_year,
                     fiscal_year_end=fiscal_year_end,
-                    is_merged=is_merged
+                    is_merged=is_merged,
+                    prompt_header=prompt_header
                 )
                 merged_tag = " [MERGED]" if is_merged else ""
                 print(f"✓ Extracted table {item['index']}{merged_tag}: {len(extracted.executives)} executives")
@@ -137,5 +164,5 @@ async def extract_all_summary_compensation(
     # Launch all extractions in parallel
     results = await asyncio.gather(*[extract_with_semaphore(item) for item in found_tables])
     
-    # Filter out None results (errors)
-    return [r for r in results if r is not None]
+    # None = failed table, kept in place so indices stay aligned with found_tables
+    return results
@@ -1,5 +1,8 @@
 # Prompts for SEC DEF 14A Table Classification and Extraction
 
+# Bump when prompts or output schemas change to invalidate cached VLM responses
+PROMPT_VERSION = 2
+
 # ============== Classification Prompt ==============
 
 CLASSIFICATION_PROMPT = """Classify this table from an SEC DEF 14A proxy statement.
@@ -81,33 +84,50 @@ Content: {table_body}
 
 Classify this table. Keep reason under 50 words."""
 
+# Template pre-split around {caption}, {footnotes}, {table_body} (in this order)
+_CLS_BEFORE_CAPTION, _CLS_REST = CLASSIFICATION_PROMPT.split("{caption}")
+_CLS_BEFORE_FOOTNOTES, _CLS_REST = _CLS_REST.split("{footnotes}")
+_CLS_BEFORE_BODY, _CLS_AFTER_BODY = _CLS_REST.split("{table_body}")
+CLASSIFICATION_PROMPT_PARTS = (_CLS_BEFORE_CAPTION, _CLS_BEFORE_FOOTNOTES, _CLS_BEFORE_BODY, _CLS_AFTER_BODY)
+
 
 # ============== Extraction Prompt ==============
 
-EXTRACTION_PROMPT = """Extract executive compensation data from this SEC DEF 14A table.
+# Output field -> canonical header synonyms, shared by both extraction prompts.
+# Output structure itself is enforced by guided_json (SummaryCompensationTable schema).
+EXTRACTION_FIELDS = {
+    "salary": ["Salary", "Base Salary", "Annual Salary"],
+    "bonus": ["Bonus", "Cash Bonus", "Annual Bonus"],
+    "stock_awards": ["Stock Awards", "Restricted Stock Awards", "RSU Awards", "Equity Awards"],
+    "option_awards": ["Option Awards", "Stock Option Awards"],
+    "non_equity_incentive": ["Non-Equity Incentive Plan", "LTIP Payouts", "Long-Term Incentive", "Incentive Plan Compensation"],
+    "change_in_pension": ["Change in Pension Value", "Pension", "Deferred Compensation Earnings"],
+    "other_compensation": ["All Other Compensation"],
+    "total": ["Total", "Total Compensation"],
+}
+# One compact line per field. No JSON here: braces would break .format() on
+# EXTRACTION_PROMPT / EXTRACTION_PROMPT_WITH_IMAGE
+EXTRACTION_FIELDS_TEXT = "\n".join(
+    f"{field} ← " + ", ".join(f'"{h}"' for h in headers)
+    for field, headers in EXTRACTION_FIELDS.items()
+)
+
+# Per-document header, rendered once per document
+EXTRACTION_PROMPT_HEADER = """Extract executive compensation data from this SEC DEF 14A table.
 
 **Company:** {company} | **CIK:** {cik} | **Filing Year:** {filing_year}
 
-**HTML TABLE:**
+"""
+
+# Per-table body, only {table_body} changes between tables
+EXTRACTION_PROMPT_BODY = """**HTML TABLE:**
 {table_body}
 
 **COLUMN MAPPING (with synonyms):**
-
-**salary** ← "Salary", "Salary($)", "Base Salary", "Annual Salary"
-
-**bonus** ← "Bonus", "Bonus($)", "Cash Bonus", "Annual Bonus", "Bonus(a)", "Bonus ($)(a)"
-
-**stock_awards** ← "Stock Awards", "Restricted Stock", "Restricted Stock Awards", "Restricted Stock Awards($)", "RSU Awards", "Equity Awards", "Restricted Stock Awards($)(a)"
-
-**option_awards** ← "Option Awards", "Option Awards($)", "Stock Option Awards" (ONLY dollar value)
-
-**non_equity_incentive** ← "Non-Equity Incentive", "Non-Equity Incentive Plan", "LTIP", "LTIP Payouts", "LTIP Payouts($)", "LTIP Payouts($)(c)", "Long-Term Incentive", "Incentive Plan Compensation"
-
-**change_in_pension** ← "Change in Pension Value", "Pension", "Deferred Compensation Earnings"
-
-**other_compensation** ← "All Other Compensation", "All Other Compensation($)", "All Other Compensation($)(d)" (RIGHTMOST column)
-
-**total** ← "Total", "Total Compensation", "Total($)"
+""" + EXTRACTION_FIELDS_TEXT + """
+Headers may also carry "($)" or footnote markers like "(a)": "Bonus ($)(a)" is still bonus.
+option_awards: ONLY the dollar value.
+other_compensation: RIGHTMOST column.
 
 **IGNORE (share counts, NOT dollars):**
 - "Securities Underlying Options", "Options(#)", "SARs(#)", "Securities Underlying Options/SARs(#)"
@@ -126,36 +146,22 @@ EXTRACTION_PROMPT = """Extract executive compensation data from this SEC DEF 14A
 
 Extract ALL executives and ALL years. Do NOT leave stock_awards or non_equity_incentive as 0 if values exist in the table."""
 
+EXTRACTION_PROMPT = EXTRACTION_PROMPT_HEADER + EXTRACTION_PROMPT_BODY
 
-# ============== Extraction Prompt WITH IMAGE (for merged tables) ==============
-
-EXTRACTION_PROMPT_WITH_IMAGE = """Extract executive compensation data from this SEC DEF 14A table.
 
-**Company:** {company} | **CIK:** {cik} | **Filing Year:** {filing_year}
+# ============== Extraction Prompt WITH IMAGE (for merged tables) ==============
 
-**HTML TABLE (may be incomplete due to page merge):**
+EXTRACTION_PROMPT_WITH_IMAGE_BODY = """**HTML TABLE (may be incomplete due to page merge):**
 {table_body}
 
 **⚠️ IMPORTANT: This table was merged from multiple pages. The HTML may be INCOMPLETE or have missing columns.**
 **USE THE IMAGE as the PRIMARY source of truth. Cross-reference with HTML but trust the IMAGE for actual values.**
 
 **COLUMN MAPPING (with synonyms):**
-
-**salary** ← "Salary", "Salary($)", "Base Salary", "Annual Salary"
-
-**bonus** ← "Bonus", "Bonus($)", "Cash Bonus", "Annual Bonus", "Bonus(a)", "Bonus ($)(a)"
-
-**stock_awards** ← "Stock Awards", "Restricted Stock", "Restricted Stock Awards", "Restricted Stock Awards($)", "RSU Awards", "Equity Awards", "Restricted Stock Awards($)(a)"
-
-**option_awards** ← "Option Awards", "Option Awards($)", "Stock Option Awards" (ONLY dollar value)
-
-**non_equity_incentive** ← "Non-Equity Incentive", "Non-Equity Incentive Plan", "LTIP", "LTIP Payouts", "LTIP Payouts($)", "LTIP Payouts($)(c)", "Long-Term Incentive", "Incentive Plan Compensation"
-
-**change_in_pension** ← "Change in Pension Value", "Pension", "Deferred Compensation Earnings"
-
-**other_compensation** ← "All Other Compensation", "All Other Compensation($)", "All Other Compensation($)(d)" (RIGHTMOST column before Total)
-
-**total** ← "Total", "Total Compensation", "Total($)"
+""" + EXTRACTION_FIELDS_TEXT + """
+Headers may also carry "($)" or footnote markers like "(a)": "Bonus ($)(a)" is still bonus.
+option_awards: ONLY the dollar value.
+other_compensation: RIGHTMOST column before Total.
 
 **IGNORE (share counts, NOT dollars):**
 - "Securities Underlying Options", "Options(#)", "SARs(#)", "Securities Underlying Options/SARs(#)"
@@ -174,3 +180,10 @@ EXTRACTION_PROMPT_WITH_IMAGE = """Extract executive compensation data from this
 5. No "Total" column → total = null
 
 Extract ALL executives and ALL years from the IMAGE."""
+
+EXTRACTION_PROMPT_WITH_IMAGE = EXTRACTION_PROMPT_HEADER + EXTRACTION_PROMPT_WITH_IMAGE_BODY
+
+# Body templates pre-split around {table_body} for cheap per-table concatenation
+EXTRACTION_BODY_PARTS = tuple(EXTRACTION_PROMPT_BODY.split("{table_body}"))
+EXTRACTION_WITH_IMAGE_BODY_PARTS = tuple(EXTRACTION_PROMPT_WITH_IMAGE_BODY.split("{table_body}"))
+
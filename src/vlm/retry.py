@@ -0,0 +1,33 @@
+# Retry with exponential backoff for transient VLM errors
+
+import asyncio
+import functools
+import random
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+# ============== CONFIGURATION ==============
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0  # Seconds, doubled at each attempt
+RETRY_MAX_DELAY = 10.0
+
+# Transient errors only: BadRequestError (malformed request) and validation
+# errors on the response would fail again identically.
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError, asyncio.TimeoutError)
+
+
+def with_retry(func):
+    """Retry an async function on RETRYABLE_ERRORS with jittered exponential backoff."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+            try:
+                return await func(*args, **kwargs)
+            except RETRYABLE_ERRORS:
+                if attempt == RETRY_MAX_ATTEMPTS:
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay))
+
+    return wrapper
@@ -1,7 +1,7 @@
 # Pydantic schemas for SEC DEF 14A Table Extraction
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
 from enum import Enum
 
 
@@ -65,6 +65,32 @@ class TableClassification(BaseModel):
     has_header: bool = Field(default=True, description="True if table contains a header row with column names (Name, Salary, Bonus, Year, etc.)")
 
 
+class ClassificationRow(NamedTuple):
+    """Compact classification record kept for every table of a document (no pydantic dump)."""
+    page_idx: Optional[int]
+    bbox: tuple
+    table_type: TableType
+    confidence: float
+    is_header_only: bool
+    has_header: bool
+    reason: str
+    
+    @classmethod
+    def from_result(cls, page_idx: Optional[int], bbox: tuple, result: TableClassification) -> "ClassificationRow":
+        return cls(page_idx, bbox, result.table_type, result.confidence,
+                   result.is_header_only, result.has_header, result.reason)
+    
+    def to_dict(self) -> dict:
+        """Same shape as TableClassification.model_dump()."""
+        return {
+            "table_type": self.table_type,
+            "confidence": self.confidence,
+            "reason": self.reason,
+            "is_header_only": self.is_header_only,
+            "has_header": self.has_header
+        }
+
+
 # ============== Extraction Schemas ==============
 
 class Executive(BaseModel):